@@ -0,0 +1,357 @@
+import math
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+# redis is optional; without it only memory:// and sqlite:/// are available
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+ROUTE_CLASSES = ("auth", "heavy", "write", "read")
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_BUCKETS = 10000
+
+
+def _refill(tokens, stamp, rate, burst, now):
+    """Take one token from a bucket last seen at `stamp` holding `tokens`.
+    Returns (tokens left, seconds until a token is available or 0.0)."""
+    if tokens is None:
+        tokens, stamp = burst, now
+    tokens = min(burst, tokens + max(now - stamp, 0.0) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+# ---- BACKENDS ----
+# Each backend offers take(key, rate, burst) -> seconds to wait (0.0 when a
+# token was taken), acquire(name, limit, ttl) -> slot or None,
+# release(name, slot) and in_flight(name).
+class MemoryBackend:
+    """Buckets and slot counts for this process only."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp, _ = self.buckets.get(key, (None, now, now))
+            tokens, wait = _refill(tokens, stamp, rate, burst, now)
+            self.buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(self.buckets) > MAX_BUCKETS:
+                # a bucket that has refilled completely is the same as a new one
+                self.buckets = {k: v for k, v in self.buckets.items() if v[2] > now}
+        return wait
+
+    def acquire(self, name, limit, ttl):
+        with self.lock:
+            if self.slots.get(name, 0) >= limit:
+                return None
+            self.slots[name] = self.slots.get(name, 0) + 1
+        return name
+
+    def release(self, name, slot):
+        with self.lock:
+            self.slots[name] -= 1
+
+    def in_flight(self, name):
+        return self.slots.get(name, 0)
+
+
+class SQLiteBackend:
+    """Buckets and slots in a shared SQLite file, so limits hold across all
+    gunicorn workers on the host. A slot left by a killed worker expires
+    after `ttl` seconds."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS slots (id INTEGER PRIMARY KEY, name TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_slots_name_expires ON slots (name, expires)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    @contextmanager
+    def _immediate(self):
+        # take the write lock up front so read-modify-write is atomic
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def take(self, key, rate, burst):
+        now = time.time()
+        with self._immediate() as conn:
+            row = conn.execute("SELECT tokens, stamp FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _refill(row[0] if row else None, row[1] if row else now, rate, burst, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, stamp, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (burst - tokens) / rate),
+            )
+            if random.random() < 0.01:
+                conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+        return wait
+
+    def acquire(self, name, limit, ttl):
+        now = time.time()
+        with self._immediate() as conn:
+            conn.execute("DELETE FROM slots WHERE name = ? AND expires < ?", (name, now))
+            count = conn.execute("SELECT COUNT(*) FROM slots WHERE name = ?", (name,)).fetchone()[0]
+            if count >= limit:
+                return None
+            return conn.execute(
+                "INSERT INTO slots (name, expires) VALUES (?, ?)", (name, now + ttl)
+            ).lastrowid
+
+    def release(self, name, slot):
+        self._conn().execute("DELETE FROM slots WHERE id = ?", (slot,))
+
+    def in_flight(self, name):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM slots WHERE name = ? AND expires >= ?", (name, time.time())
+        ).fetchone()[0]
+
+
+TAKE_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or burst
+local stamp = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - stamp, 0) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return tostring(wait)
+"""
+
+ACQUIRE_SCRIPT = """
+local limit, ttl, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= limit then return 0 end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl) + 1)
+return 1
+"""
+
+
+class RedisBackend:
+    """Buckets and slots in Redis (or a compatible server), shared by every
+    worker on every host; each check is one atomic script call."""
+
+    prefix = "admission:"
+
+    def __init__(self, url):
+        if redis is None:
+            raise ValueError("ADMISSION_URL redis:// needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.take_script = self.client.register_script(TAKE_SCRIPT)
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        return float(self.take_script(keys=[self.prefix + "bucket:" + key], args=[rate, burst, time.time()]))
+
+    def acquire(self, name, limit, ttl):
+        slot = uuid.uuid4().hex
+        admitted = self.acquire_script(keys=[self.prefix + "slots:" + name], args=[limit, ttl, time.time(), slot])
+        return slot if admitted else None
+
+    def release(self, name, slot):
+        self.client.zrem(self.prefix + "slots:" + name, slot)
+
+    def in_flight(self, name):
+        return self.client.zcount(self.prefix + "slots:" + name, time.time(), "+inf")
+
+
+def make_backend(url):
+    if url == "memory://":
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported ADMISSION_URL '{url}'")
+
+
+# ---- ADMISSION ----
+def _identity():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:  # invalid or expired tokens are left to jwt_required
+        return None
+
+
+class Admission:
+    """Rejects requests up front, before they take a worker thread for long.
+
+    Every request spends a token from its client IP's bucket and, when it
+    carries a valid JWT, from that user's bucket; auth routes also spend from
+    a tighter per-IP auth bucket. An empty bucket answers 429. Each route
+    class (auth, heavy, write, read) then has a cap on requests in progress;
+    over the cap answers 503. Both carry Retry-After. Requests the response
+    cache can answer skip the cap.
+
+    Views join a class with @admission.classify; other views are "write" for
+    POST/PUT/PATCH/DELETE and "read" otherwise. With memory:// buckets and
+    caps are per process; with a shared ADMISSION_URL they hold across
+    workers."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.lock = threading.Lock()
+        self.counters = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config["ADMISSION_ENABLED"]
+        self.backend = make_backend(config["ADMISSION_URL"])
+        self.user_limit = (config["RATE_LIMIT_USER_PER_SECOND"], config["RATE_LIMIT_USER_BURST"])
+        self.ip_limit = (config["RATE_LIMIT_IP_PER_SECOND"], config["RATE_LIMIT_IP_BURST"])
+        self.auth_limit = (config["RATE_LIMIT_AUTH_PER_SECOND"], config["RATE_LIMIT_AUTH_BURST"])
+        self.caps = {name: config[f"ADMISSION_MAX_{name.upper()}"] for name in ROUTE_CLASSES}
+        self.slot_ttl = config["ADMISSION_SLOT_TTL"]
+        self.busy_retry_after = config["ADMISSION_RETRY_AFTER"]
+        self.counters = {name: {"admitted": 0, "limited": 0, "busy": 0} for name in ROUTE_CLASSES}
+        app.extensions["admission"] = self
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.teardown_request(self._teardown_request)
+
+    def classify(self, route_class, paginated=None):
+        """Put a view in a route class. With `paginated`, requests that pass
+        limit or cursor fall in that class instead."""
+        if route_class not in ROUTE_CLASSES or paginated not in ROUTE_CLASSES + (None,):
+            raise ValueError(f"Route classes are {', '.join(ROUTE_CLASSES)}")
+
+        def decorator(view):
+            view.admission_class = (route_class, paginated)
+            return view
+        return decorator
+
+    def exempt(self, view):
+        """Never limit this view (health checks, metrics scrapes)."""
+        view.admission_class = None
+        return view
+
+    def route_class(self):
+        view = current_app.view_functions.get(request.endpoint)
+        default = ("write" if request.method in WRITE_METHODS else "read", None)
+        classified = getattr(view, "admission_class", default)
+        if classified is None:
+            return None
+        route_class, paginated = classified
+        if paginated is not None and ("limit" in request.args or "cursor" in request.args):
+            return paginated
+        return route_class
+
+    def _count(self, route_class, outcome):
+        with self.lock:
+            self.counters[route_class][outcome] += 1
+
+    def _rate_limited(self, route_class):
+        """Seconds until the request's buckets allow it, or 0.0."""
+        address = request.remote_addr or "unknown"
+        buckets = [("ip:" + address, self.ip_limit)]
+        if route_class == "auth":
+            buckets.append(("auth:" + address, self.auth_limit))
+        identity = _identity()
+        if identity is not None:
+            buckets.append((f"user:{identity}", self.user_limit))
+        for key, (rate, burst) in buckets:
+            wait = self.backend.take(key, rate, burst)
+            if wait:
+                return wait
+        return 0.0
+
+    @staticmethod
+    def _cached():
+        """Whether the response cache holds a fresh answer for this request.
+        Serving it is cheap, so it needs no slot in the route's class."""
+        view = current_app.view_functions.get(request.endpoint)
+        tables = getattr(view, "cache_tables", None)
+        cache = current_app.extensions.get("response_cache")
+        if not tables or cache is None or request.method != "GET":
+            return False
+        return cache.lookup(tables) is not None
+
+    @staticmethod
+    def _reject(status, message, retry_after):
+        response = jsonify({"error": message})
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response, status
+
+    def _before_request(self):
+        route_class = self.route_class()
+        if route_class is None:
+            return None
+        wait = self._rate_limited(route_class)
+        if wait:
+            self._count(route_class, "limited")
+            return self._reject(429, "Too many requests, please retry later", wait)
+        cap = self.caps[route_class]
+        if cap and not self._cached():
+            slot = self.backend.acquire(route_class, cap, self.slot_ttl)
+            if slot is None:
+                self._count(route_class, "busy")
+                return self._reject(503, "Server is busy, please retry", self.busy_retry_after)
+            g._admission_slot = (route_class, slot)
+        self._count(route_class, "admitted")
+        return None
+
+    def _teardown_request(self, exc):
+        held = g.pop("_admission_slot", None)
+        if held is not None:
+            self.backend.release(*held)
+
+    def stats(self):
+        with self.lock:
+            stats = {name: dict(counters) for name, counters in self.counters.items()}
+        for name, cap in self.caps.items():
+            stats[name]["cap"] = cap
+            stats[name]["in_flight"] = self.backend.in_flight(name) if cap else None
+        return stats
+
+    def gauges(self):
+        return {
+            f"{name}_{key}": value
+            for name, stats in self.stats().items()
+            for key, value in stats.items()
+            if value is not None
+        }
+
+
+admission = Admission()
@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+from sqlalchemy import case, event, func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import Book, Review
+from cache import mark_changed
+
+
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def _bucket(rating):
+    return getattr(Book, f"rating_{rating}") if rating in RATINGS else None
+
+
+def _old_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, key)
+
+
+def _apply_deltas(session, deltas):
+    # Core UPDATEs: the cache's flush hook would only see the reviews
+    mark_changed(session, "books")
+    for book_id, (count, total, histogram) in deltas.items():
+        if not count and not total and not any(histogram.values()):
+            continue
+        new_count = Book.review_count + count
+        new_sum = Book.rating_sum + total
+        values = {
+            Book.review_count: new_count,
+            Book.rating_sum: new_sum,
+            Book.rating_avg: case(
+                (new_count > 0, new_sum * 1.0 / new_count),
+                else_=0.0,
+            ),
+        }
+        for rating, change in histogram.items():
+            if change:
+                values[_bucket(rating)] = _bucket(rating) + change
+        session.execute(
+            update(Book).where(Book.id == book_id).values(values),
+            execution_options={"synchronize_session": False},
+        )
+        book = session.identity_map.get(session.identity_key(Book, (book_id,)))
+        if book is not None:
+            session.expire(book, [c.key for c in values])
+
+
+# Reviews change a book's aggregates through an in-place UPDATE issued in the
+# same flush, so concurrent reviewers never overwrite each other's counts.
+@event.listens_for(Session, "after_flush")
+def _maintain_book_aggregates(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0, defaultdict(int)])
+
+    def add(book_id, rating, sign):
+        if book_id is None or rating is None:
+            return
+        entry = deltas[book_id]
+        entry[0] += sign
+        entry[1] += sign * rating
+        if rating in RATINGS:
+            entry[2][rating] += sign
+
+    for obj in session.new:
+        if isinstance(obj, Review):
+            add(obj.book_id, obj.rating, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Review):
+            add(_old_value(obj, "book_id"), _old_value(obj, "rating"), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Review) and obj not in session.deleted:
+            old_book, old_rating = _old_value(obj, "book_id"), _old_value(obj, "rating")
+            if (old_book, old_rating) != (obj.book_id, obj.rating):
+                add(old_book, old_rating, -1)
+                add(obj.book_id, obj.rating, 1)
+
+    if deltas:
+        _apply_deltas(session, deltas)
+
+
+def refresh_book_aggregates(session, book_ids=None):
+    """Recompute aggregates from the reviews table with one grouped pass.
+
+    Used for backfills and for bulk paths that insert reviews with Core
+    statements and so bypass the flush hook above."""
+    counters = [Book.review_count, Book.rating_sum, Book.rating_avg] + [_bucket(r) for r in RATINGS]
+    grouped = select(
+        Review.book_id.label("book_id"),
+        func.count(Review.id).label("review_count"),
+        func.sum(Review.rating).label("rating_sum"),
+        *[func.count(Review.id).filter(Review.rating == r).label(f"rating_{r}") for r in RATINGS],
+    ).group_by(Review.book_id)
+    reset = update(Book).values({column: 0 for column in counters})
+    if book_ids is not None:
+        book_ids = list(book_ids)
+        grouped = grouped.where(Review.book_id.in_(book_ids))
+        reset = reset.where(Book.id.in_(book_ids))
+    grouped = grouped.subquery()
+
+    values = {column: grouped.c[column.key] for column in counters if column.key != "rating_avg"}
+    values[Book.rating_avg] = grouped.c.rating_sum * 1.0 / grouped.c.review_count
+    options = {"synchronize_session": False}
+    session.execute(reset, execution_options=options)
+    session.execute(
+        update(Book).where(Book.id == grouped.c.book_id).values(values),
+        execution_options=options,
+    )
+    mark_changed(session, "books")
@@ -1,26 +1,47 @@
 import os
 from datetime import timedelta
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_jwt_extended import (
     JWTManager, create_access_token,
     jwt_required, get_jwt_identity, create_refresh_token
 )
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_migrate import Migrate
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Import db and models
 from models import db, User, Book, Review
 from config import Config
+from loading import load_books, load_reviews
+from listing import BookListing, ReviewListing, ListingError
+from export import export_response
+from cache import response_cache
+from search import BookSearch
+from bulk import IMPORTERS, BulkError, _int, detect_format, read_rows, text_stream
+from cli import register_commands
+from passwords import password_hasher, HashPoolFull
+from engine import engine_options, init_engine, pool_stats
+from instrumentation import instrumentation
+from encoding import FastJSONProvider
+from compression import compression
+from sync import sync
+from replicas import replicas
+from similarity import parse_limit, recommend_for, similar_to
+from batch import Batch, delete_books
+from profiles import profile
+from admission import admission
 
 # Load environment variables
 load_dotenv()
 
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
 
 def create_app():
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     CORS(app)
 
     # --- Database Config ---
@@ -36,14 +57,60 @@ def create_app():
 
     # Load extra config
     app.config.from_object(Config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    # Client addresses (rate limits, logs) come from the trusted proxy hops
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
     # Init extensions
     db.init_app(app)
-    migrate = Migrate(app, db)
+    init_engine(app, db)
+    migrate = Migrate(app, db, directory=MIGRATIONS_DIR)
     JWTManager(app)
+    response_cache.init_app(app)
+    password_hasher.init_app(app)
+    instrumentation.init_app(app, db)
+    # after instrumentation, so its after_request hook runs first and is timed
+    compression.init_app(app)
+    replicas.init_app(app)
+    # after instrumentation, so rejected requests are still counted and timed
+    admission.init_app(app)
+    for engine in replicas.engines:
+        instrumentation.watch(engine)
+    instrumentation.add_gauges('response_cache', 'Response cache counters.', response_cache.stats)
+    instrumentation.add_gauges('db_pool', 'Connection pool usage.', lambda: pool_stats(db.engine))
+    instrumentation.add_gauges(
+        'password_hashing', 'Password hashing pool.', lambda: {"rejected": password_hasher.rejected}
+    )
+    instrumentation.add_gauges('compression', 'Response compression by encoding.', compression.gauges)
+    instrumentation.add_gauges('admission', 'Admission control by route class.', admission.gauges)
+
+    @app.errorhandler(ListingError)
+    @app.errorhandler(BulkError)
+    def bad_request(err):
+        return jsonify({"error": str(err)}), 400
+
+    @app.errorhandler(HashPoolFull)
+    def auth_busy(err):
+        response = jsonify({"error": "Authentication is busy, please retry"})
+        response.headers['Retry-After'] = str(err.retry_after)
+        return response, 503
+
+    def run_import(kind):
+        fmt = detect_format(request.args.get('format'), request.content_type)
+        importer = IMPORTERS[kind](batch_size=app.config['BULK_BATCH_SIZE'])
+        try:
+            rows = read_rows(text_stream(request.stream), fmt)
+            result = importer.run(rows, get_jwt_identity())
+        except UnicodeDecodeError:
+            # batches before the bad bytes are already committed
+            return jsonify(error="Body must be UTF-8 encoded", **importer.result()), 400
+        return jsonify(result), 200
 
     # ---- AUTH ----
     @app.route('/signup', methods=['POST'])
+    @admission.classify('auth')
     def signup():
         data = request.json
         username = data.get('username')
@@ -56,7 +123,7 @@ def create_app():
         if User.query.filter_by(username=username).first():
             return jsonify({"error": "Username already exists"}), 400
 
-        hashed_pw = generate_password_hash(password)
+        hashed_pw = password_hasher.hash(password)
         user = User(username=username, email=email, password_hash=hashed_pw)
         db.session.add(user)
         db.session.commit()
@@ -70,15 +137,26 @@ def create_app():
         }), 201
 
     @app.route('/login', methods=['POST'])
+    @admission.classify('auth')
     def login():
         data = request.json
         username = data.get('username')
         password = data.get('password')
 
         user = User.query.filter_by(username=username).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not password_hasher.verify(user.password_hash, password):
             return jsonify({"error": "Invalid credentials"}), 401
 
+        # Upgrade hashes made with outdated parameters while we have the
+        # password. Best effort: when the hashing pool is full the upgrade
+        # waits for a later login rather than failing this one.
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(password)
+                db.session.commit()
+            except HashPoolFull:
+                pass
+
         token = create_access_token(identity=user.id)
         refresh = create_refresh_token(identity=user.id)
         return jsonify({
@@ -88,6 +166,7 @@ def create_app():
         }), 200
 
     @app.route("/refresh", methods=["POST"])
+    @admission.classify('auth')
     @jwt_required(refresh=True)
     def refresh():
         user_id = get_jwt_identity()
@@ -96,10 +175,34 @@ def create_app():
 
     # ---- BOOKS ----
     @app.route('/books', methods=['GET'])
+    @admission.classify('heavy', paginated='read')
     @jwt_required()
+    @replicas.reads
+    @response_cache.cached('books', 'reviews', 'users')
     def get_books():
-        books = Book.query.all()
-        return jsonify([b.to_dict(include_relationships=True) for b in books]), 200
+        return jsonify(BookListing(request.args).response()), 200
+
+    @app.route('/books/top', methods=['GET'])
+    @admission.classify('heavy')
+    @jwt_required()
+    @replicas.reads
+    @response_cache.cached('books', 'reviews', 'users')
+    def top_books():
+        by = request.args.get('by', 'rating')
+        if by not in ('rating', 'reviews'):
+            return jsonify({"error": "by must be 'rating' or 'reviews'"}), 400
+        args = request.args.to_dict()
+        args['sort'] = '-' + by
+        args.setdefault('limit', str(app.config['PAGE_SIZE_DEFAULT']))
+        return jsonify(BookListing(args).response()), 200
+
+    @app.route('/books/search', methods=['GET'])
+    @admission.classify('heavy', paginated='read')
+    @jwt_required()
+    @replicas.reads
+    @response_cache.cached('books', 'reviews', 'users')
+    def search_books():
+        return jsonify(BookSearch(request.args).response()), 200
 
     @app.route('/books', methods=['POST'])
     @jwt_required()
@@ -117,10 +220,16 @@ def create_app():
         db.session.commit()
         return jsonify(book.to_dict(include_relationships=True)), 201
 
+    @app.route('/books/bulk', methods=['POST'])
+    @admission.classify('heavy')
+    @jwt_required()
+    def bulk_add_books():
+        return run_import('books')
+
     @app.route('/books/<int:book_id>', methods=['PATCH'])
     @jwt_required()
     def update_book(book_id):
-        book = Book.query.get_or_404(book_id)
+        book = load_books().filter_by(id=book_id).first_or_404()
         current_user_id = get_jwt_identity()
         if book.user_id != current_user_id:
             return jsonify({"error": "Unauthorized"}), 403
@@ -139,16 +248,20 @@ def create_app():
         current_user_id = get_jwt_identity()
         if book.user_id != current_user_id:
             return jsonify({"error": "Unauthorized"}), 403
-        db.session.delete(book)
+        # set-based, so the book's reviews go with it without being loaded
+        delete_books(db.session, [book_id])
         db.session.commit()
+        response_cache.touch('books', 'reviews', 'book_similarities')
         return jsonify({"msg": "Book deleted"}), 200
 
     # ---- REVIEWS ----
     @app.route('/reviews', methods=['GET'])
+    @admission.classify('heavy', paginated='read')
     @jwt_required()
+    @replicas.reads
+    @response_cache.cached('reviews', 'books', 'users')
     def get_reviews():
-        reviews = Review.query.all()
-        return jsonify([r.to_dict(include_relationships=True) for r in reviews]), 200
+        return jsonify(ReviewListing(request.args).response()), 200
 
     @app.route('/reviews', methods=['POST'])
     @jwt_required()
@@ -156,7 +269,8 @@ def create_app():
         data = request.json
         current_user_id = get_jwt_identity()
         review = Review(
-            rating=data['rating'],
+            # the book's aggregates count it in a histogram bucket
+            rating=_int(data, 'rating', 1, 5),
             comment=data['comment'],
             book_id=data['book_id'],
             user_id=current_user_id
@@ -165,15 +279,22 @@ def create_app():
         db.session.commit()
         return jsonify(review.to_dict(include_relationships=True)), 201
 
+    @app.route('/reviews/bulk', methods=['POST'])
+    @admission.classify('heavy')
+    @jwt_required()
+    def bulk_add_reviews():
+        return run_import('reviews')
+
     @app.route('/reviews/<int:review_id>', methods=['PATCH'])
     @jwt_required()
     def update_review(review_id):
-        review = Review.query.get_or_404(review_id)
+        review = load_reviews().filter_by(id=review_id).first_or_404()
         current_user_id = get_jwt_identity()
         if review.user_id != current_user_id:
             return jsonify({"error": "Unauthorized"}), 403
         data = request.json
-        review.rating = data.get('rating', review.rating)
+        if 'rating' in data:
+            review.rating = _int(data, 'rating', 1, 5)
         review.comment = data.get('comment', review.comment)
         db.session.commit()
         return jsonify(review.to_dict(include_relationships=True)), 200
@@ -189,13 +310,103 @@ def create_app():
         db.session.commit()
         return jsonify({"msg": "Review deleted"}), 200
 
+    # ---- USERS ----
+    @app.route('/users/<int:user_id>', methods=['GET'])
+    @jwt_required()
+    @replicas.reads
+    @response_cache.cached('users', 'books', 'reviews')
+    def get_user(user_id):
+        data = profile(user_id, request.args)
+        if data is None:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify(data), 200
+
+    # Not cached: the cache is keyed on the path, which /me shares across users
+    @app.route('/me', methods=['GET'])
+    @jwt_required()
+    @replicas.reads
+    def get_me():
+        data = profile(get_jwt_identity(), request.args)
+        if data is None:
+            return jsonify({"error": "User not found"}), 404
+        return jsonify(data), 200
+
+    # ---- BATCH ----
+    @app.route('/batch', methods=['POST'])
+    @admission.classify('heavy')
+    @jwt_required()
+    def batch_write():
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise BulkError("Body must be a JSON object with an operations list")
+        batch = Batch(data.get('operations'), get_jwt_identity(), app.config['BATCH_MAX_OPERATIONS'])
+        result = batch.run(db.session)
+        return jsonify(result), 200 if result['applied'] else 400
+
+    # ---- RECOMMENDATIONS ----
+    @app.route('/books/<int:book_id>/similar', methods=['GET'])
+    @admission.classify('heavy')
+    @jwt_required()
+    @replicas.reads
+    @response_cache.cached('book_similarities', 'books', 'reviews')
+    def similar_books(book_id):
+        Book.query.get_or_404(book_id)
+        limit = parse_limit(request.args.get('limit'), app.config['SIMILAR_TOP_K'])
+        return jsonify(similar_to(book_id, limit)), 200
+
+    @app.route('/users/<int:user_id>/recommendations', methods=['GET'])
+    @admission.classify('heavy')
+    @jwt_required()
+    @replicas.reads
+    @response_cache.cached('book_similarities', 'reviews', 'books', 'users')
+    def recommended_books(user_id):
+        User.query.get_or_404(user_id)
+        limit = parse_limit(request.args.get('limit'), app.config['PAGE_SIZE_MAX'])
+        return jsonify(recommend_for(user_id, limit)), 200
+
+    # ---- EXPORT ----
+    @app.route('/export/books', methods=['GET'])
+    @admission.classify('heavy')
+    @jwt_required()
+    @replicas.reads
+    def export_books():
+        return export_response(BookListing(request.args), request.args.get('format', 'json'))
+
+    @app.route('/export/reviews', methods=['GET'])
+    @admission.classify('heavy')
+    @jwt_required()
+    @replicas.reads
+    def export_reviews():
+        return export_response(ReviewListing(request.args), request.args.get('format', 'json'))
+
+    # ---- SYNC ----
+    @app.route('/sync', methods=['GET'])
+    @admission.classify('heavy')
+    @jwt_required()
+    def sync_changes():
+        return jsonify(sync(request.args)), 200
+
     # ---- HEALTH CHECK ----
     @app.route('/health')
+    @admission.exempt
     def health_check():
-        return jsonify({"status": "healthy", "message": "Server is running"}), 200
+        return jsonify({
+            "status": "healthy",
+            "message": "Server is running",
+            "cache": response_cache.stats(),
+            "pool": pool_stats(db.engine),
+            "compression": compression.stats(),
+            "replicas": replicas.stats(),
+            "admission": admission.stats()
+        }), 200
+
+    @app.route('/metrics')
+    @admission.exempt
+    def metrics():
+        return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
 
-    with app.app_context():
-        db.create_all()
+    # Schema changes are applied with `flask upgrade-db`, never at worker boot
+    register_commands(app)
 
     return app
 
@@ -0,0 +1,246 @@
+from flask import current_app, has_app_context
+from sqlalchemy import delete, insert, or_, select, update
+
+from models import utcnow, Book, BookSimilarity, Review
+from aggregates import refresh_book_aggregates
+from bulk import BulkError, _int, _text, validate_book, validate_review
+from rows import IN_BATCH_SIZE
+from similarity import queue_stale_books
+from sync import record_tombstones
+
+
+OPS = ("create", "patch", "delete")
+MODELS = {"book": Book, "review": Review}
+VALIDATORS = {"book": validate_book, "review": validate_review}
+
+# Fields a patch may change, as in PATCH /books/<id> and /reviews/<id>
+PATCHABLE = {
+    "book": {
+        "title": lambda data: _text(data, "title", 200),
+        "author": lambda data: _text(data, "author", 100),
+        "year_published": lambda data: _int(data, "year_published"),
+        "description": lambda data: _text(data, "description"),
+    },
+    "review": {
+        "rating": lambda data: _int(data, "rating", 1, 5),
+        "comment": lambda data: _text(data, "comment"),
+    },
+}
+
+
+class OperationError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Operation:
+    __slots__ = ("index", "op", "kind", "id", "values", "new_id")
+
+    def __init__(self, index, record, user_id):
+        self.index = index
+        self.new_id = None
+        if not isinstance(record, dict):
+            raise OperationError(400, "Each operation must be a JSON object")
+        self.op = record.get("op")
+        self.kind = record.get("type")
+        if self.op not in OPS:
+            raise OperationError(400, f"op must be one of {', '.join(OPS)}")
+        if self.kind not in MODELS:
+            raise OperationError(400, f"type must be one of {', '.join(MODELS)}")
+        data = record.get("data") or {}
+        if not isinstance(data, dict):
+            raise OperationError(400, "data must be an object")
+        try:
+            if self.op == "create":
+                self.id = None
+                self.values = VALIDATORS[self.kind](data, user_id)
+            else:
+                self.id = _int(record, "id")
+                self.values = self._patch_values(data) if self.op == "patch" else None
+        except BulkError as err:
+            raise OperationError(400, str(err))
+
+    def _patch_values(self, data):
+        fields = PATCHABLE[self.kind]
+        unknown = set(data) - set(fields)
+        if unknown:
+            raise BulkError(f"Cannot patch: {', '.join(sorted(unknown))}")
+        if not data:
+            raise BulkError("data must set at least one field")
+        return {key: parse(data) for key, parse in fields.items() if key in data}
+
+    def result(self):
+        return {
+            "index": self.index,
+            "op": self.op,
+            "type": self.kind,
+            "id": self.new_id if self.op == "create" else self.id,
+            "status": 201 if self.op == "create" else 200,
+        }
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        yield ids[start:start + IN_BATCH_SIZE]
+
+
+def _owners(session, model, ids):
+    """{id: (user_id, book_id or None)} for the existing rows among `ids`."""
+    book_column = model.book_id if model is Review else None
+    columns = [model.id, model.user_id] + ([book_column] if book_column is not None else [])
+    owners = {}
+    for chunk in _chunks(ids):
+        for row in session.execute(select(*columns).where(model.id.in_(chunk))):
+            owners[row[0]] = (row[1], row[2] if book_column is not None else None)
+    return owners
+
+
+# ---- SET-BASED WRITES ----
+def delete_books(session, book_ids):
+    """Delete books with their reviews and similarity rows, set-based.
+    Returns the ids of the reviews removed with them."""
+    review_ids = []
+    for chunk in _chunks(book_ids):
+        review_ids.extend(session.scalars(select(Review.id).where(Review.book_id.in_(chunk))))
+        session.execute(delete(Review).where(Review.book_id.in_(chunk)))
+        session.execute(delete(BookSimilarity).where(or_(
+            BookSimilarity.book_id.in_(chunk), BookSimilarity.similar_book_id.in_(chunk)
+        )))
+        session.execute(delete(Book).where(Book.id.in_(chunk)))
+    record_tombstones(session, "reviews", review_ids)
+    record_tombstones(session, "books", book_ids)
+    return review_ids
+
+
+def delete_reviews(session, review_ids):
+    for chunk in _chunks(review_ids):
+        session.execute(delete(Review).where(Review.id.in_(chunk)))
+    record_tombstones(session, "reviews", review_ids)
+
+
+def _patch(session, model, operations):
+    """One executemany UPDATE by primary key, grouped by the fields set."""
+    now = utcnow()
+    rows = [dict(op.values, id=op.id, updated_at=now) for op in operations]
+    session.execute(update(model), rows, execution_options={"synchronize_session": False})
+
+
+def _create(session, model, operations):
+    rows = [op.values for op in operations]
+    ids = session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+    for op, new_id in zip(operations, ids):
+        op.new_id = new_id
+
+
+# ---- BATCH ----
+class Batch:
+    """Create, patch and delete books and reviews in one transaction.
+
+    Targets of every patch and delete are looked up and ownership-checked
+    with one query per table, then each kind of change is applied with
+    set-based INSERT, UPDATE and DELETE statements. Either every operation
+    applies or none does; errors are reported per operation index.
+
+    A row may be the target of one patch or delete per batch. Reviews can
+    only be created on books that exist before the batch and that it does
+    not delete."""
+
+    def __init__(self, records, user_id, max_operations):
+        if not isinstance(records, list):
+            raise BulkError("operations must be a list")
+        if not records:
+            raise BulkError("operations must not be empty")
+        if len(records) > max_operations:
+            raise BulkError(f"At most {max_operations} operations per batch")
+        self.user_id = user_id
+        self.operations = []
+        self.errors = []
+        for index, record in enumerate(records):
+            try:
+                self.operations.append(Operation(index, record, user_id))
+            except OperationError as err:
+                self.error(index, err.status, str(err))
+
+    def error(self, index, status, message):
+        self.errors.append({"index": index, "status": status, "error": message})
+
+    def select(self, op=None, kind=None):
+        return [o for o in self.operations if (op is None or o.op == op) and (kind is None or o.kind == kind)]
+
+    def check(self, session):
+        targets = {"book": {}, "review": {}}
+        for op in self.operations:
+            if op.op != "create":
+                if op.id in targets[op.kind]:
+                    self.error(op.index, 400, f"{op.kind} {op.id} is already targeted by operation "
+                                              f"{targets[op.kind][op.id].index}")
+                else:
+                    targets[op.kind][op.id] = op
+        review_books = {op.values["book_id"] for op in self.select("create", "review")}
+        books = _owners(session, Book, set(targets["book"]) | review_books)
+        reviews = _owners(session, Review, targets["review"])
+        deleted_books = {op.id for op in self.select("delete", "book")}
+
+        for op in self.operations:
+            if op.op == "create":
+                book_id = op.values.get("book_id")
+                if op.kind == "review" and book_id not in books:
+                    self.error(op.index, 404, f"Book {book_id} not found")
+                elif op.kind == "review" and book_id in deleted_books:
+                    self.error(op.index, 400, f"Book {book_id} is deleted by this batch")
+                continue
+            owner = (books if op.kind == "book" else reviews).get(op.id)
+            if owner is None:
+                self.error(op.index, 404, f"{op.kind.capitalize()} {op.id} not found")
+            elif owner[0] != self.user_id:
+                self.error(op.index, 403, "Unauthorized")
+            elif op.kind == "review" and owner[1] in deleted_books:
+                self.error(op.index, 400, f"Book {owner[1]} is deleted by this batch")
+        self.review_books = {op.id: reviews[op.id][1] for op in self.select(kind="review") if op.id in reviews}
+        self.errors.sort(key=lambda e: e["index"])
+        return not self.errors
+
+    def apply(self, session):
+        touched = set()  # books whose reviews changed
+        for op in self.select("create", "review"):
+            touched.add(op.values["book_id"])
+        for op in self.select("patch", "review") + self.select("delete", "review"):
+            if op.op == "delete" or "rating" in op.values:
+                touched.add(self.review_books[op.id])
+
+        for kind in ("book", "review"):
+            creates = self.select("create", kind)
+            if creates:
+                _create(session, MODELS[kind], creates)
+            patches = self.select("patch", kind)
+            if patches:
+                _patch(session, MODELS[kind], patches)
+        review_deletes = [op.id for op in self.select("delete", "review")]
+        if review_deletes:
+            delete_reviews(session, review_deletes)
+        book_deletes = [op.id for op in self.select("delete", "book")]
+        if book_deletes:
+            delete_books(session, book_deletes)
+            touched -= set(book_deletes)
+
+        # Core statements skip the flush hooks for aggregates and similarity
+        if touched:
+            refresh_book_aggregates(session, touched)
+        queue_stale_books(session, touched)
+
+    def run(self, session):
+        if not self.check(session):
+            return {"applied": False, "errors": self.errors}
+        try:
+            self.apply(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        tables = ("books", "reviews", "book_similarities") if self.select("delete", "book") else ("books", "reviews")
+        cache = current_app.extensions.get("response_cache") if has_app_context() else None
+        if cache is not None:
+            cache.touch(*tables)
+        return {"applied": True, "results": [op.result() for op in self.operations]}
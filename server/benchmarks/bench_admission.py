@@ -0,0 +1,158 @@
+"""Cheap-route tail latency during a spike on expensive routes.
+
+Starts gunicorn the way the Procfile does (gthread workers) on a copy of the
+seeded database and, for each setting, runs:
+
+  * a few clients calling a cheap route (a 20-row page of /books),
+  * alone first, then alongside many clients hammering an expensive one
+    (the full, uncached /books listing), waiting out Retry-After when told
+    to back off.
+
+Without admission control the spike takes every worker thread and the
+cheap route's p99 follows the expensive route's latency. With it, the heavy
+class is capped through the shared SQLite backend (so the cap holds across
+workers) and the excess is answered 503 right away. Rate limits are raised
+out of the way here so only the concurrency caps are measured.
+
+Run from server/:  python -m benchmarks.bench_admission --size 100k
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_endpoints import SERVER, _free_port, prepare_database, summarize
+
+
+def _start(db_path, env_overrides, workers, threads):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + db_path, INSTRUMENTATION_ENABLED="0", **env_overrides)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--worker-class", "gthread", "--threads", str(threads),
+         "--log-level", "warning"],
+        cwd=SERVER, env=env,
+    )
+    deadline = time.time() + 30
+    while True:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            return server, port
+        except OSError:
+            if time.time() > deadline:
+                server.terminate()
+                raise RuntimeError("gunicorn did not start")
+            time.sleep(0.2)
+
+
+def _client(port, token, path, stop, latencies, statuses, lock):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+    headers = {"Authorization": f"Bearer {token}"}
+    i = 0
+    while not stop.is_set():
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path.format(i=i), headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            retry_after = response.getheader("Retry-After")
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+            status, retry_after = 599, None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+        if status in (429, 503) and retry_after:
+            stop.wait(float(retry_after))
+
+
+def _phase(port, groups, duration):
+    """Run client groups [(name, token, path, clients)] for `duration` seconds."""
+    stop, lock = threading.Event(), threading.Lock()
+    results, threads = {}, []
+    for name, token, path, clients in groups:
+        latencies, statuses = [], {}
+        results[name] = (latencies, statuses)
+        threads += [
+            threading.Thread(target=_client, args=(port, token, path, stop, latencies, statuses, lock))
+            for _ in range(clients)
+        ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        name: dict(summarize(latencies, duration, 0), statuses=statuses)
+        for name, (latencies, statuses) in results.items() if latencies
+    }
+
+
+def run(size, workers, threads, spike_clients, cheap_clients, duration, heavy_cap):
+    db_path = prepare_database(size)
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    sys.path.insert(0, SERVER)
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        cheap_token = create_access_token(identity=1)
+        heavy_token = create_access_token(identity=2)
+
+    cheap = ("cheap", cheap_token, "/books?limit=20&_={i}", cheap_clients)
+    heavy = ("heavy", heavy_token, "/books?_={i}", spike_clients)
+    unlimited = {name: "1000000" for name in (
+        "RATE_LIMIT_IP_PER_SECOND", "RATE_LIMIT_IP_BURST", "RATE_LIMIT_USER_PER_SECOND", "RATE_LIMIT_USER_BURST",
+    )}
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = (
+            ("admission off", {"ADMISSION_ENABLED": "0"}),
+            ("admission on", dict(
+                unlimited, ADMISSION_ENABLED="1", ADMISSION_URL="sqlite:///" + os.path.join(tmp, "admission.db"),
+                ADMISSION_MAX_HEAVY=str(heavy_cap),
+            )),
+        )
+        print(f"size {size}, {workers} workers x {threads} threads, {cheap_clients} cheap clients, "
+              f"{spike_clients} spike clients, {duration:.0f} s per phase, heavy cap {heavy_cap}")
+        print(f"{'setting':<15} {'phase':<7} {'route':<6} {'requests':>8} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9}  statuses")
+        for label, overrides in settings:
+            server, port = _start(db_path, overrides, workers, threads)
+            try:
+                for phase, groups in (("calm", [cheap]), ("spike", [cheap, heavy])):
+                    for route, stats in _phase(port, groups, duration).items():
+                        statuses = ", ".join(f"{code}: {n}" for code, n in sorted(stats["statuses"].items()))
+                        print(f"{label:<15} {phase:<7} {route:<6} {stats['requests']:>8} {stats['p50_ms']:>9.1f} "
+                              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}  {statuses}")
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="100k")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers (Procfile: 1, the default)")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--spike-clients", type=int, default=16)
+    parser.add_argument("--cheap-clients", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--heavy-cap", type=int, default=2)
+    args = parser.parse_args(argv)
+    run(args.size, args.workers, args.threads, args.spike_clients, args.cheap_clients, args.duration, args.heavy_cap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""Endpoint latency, throughput and query-count benchmark with a regression gate.
+
+Seeds a SQLite file at the chosen size (cached under benchmarks/data/), then
+drives every route through the Flask test client and/or a local gunicorn.
+gunicorn runs the worker class the Procfile deploys (gthread). Results are
+written as JSON and compared against the committed baseline
+(benchmarks/baseline-<size>.json); any p95 regression beyond the tolerance,
+any increase in SQL queries per request, or a missing baseline exits
+non-zero.
+
+Run from server/:
+    python -m benchmarks.bench_endpoints --size 1k --mode both
+    python -m benchmarks.bench_endpoints --size 100k --mode both
+
+After an intended change in performance, regenerate the baseline on the same
+kind of machine and commit it with the change:
+    python -m benchmarks.bench_endpoints --size 1k --mode both --update-baseline
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import resource
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import closing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.dirname(HERE)
+DATA_DIR = os.path.join(HERE, "data")
+RESULTS_DIR = os.path.join(HERE, "results")
+
+# name -> (users, books, reviews)
+SIZES = {
+    "1k": (50, 100, 1000),
+    "100k": (1000, 10000, 100000),
+    "1m": (10000, 100000, 1000000),
+}
+PASSWORD = "password123"
+
+
+# ---- DATA ----
+def prepare_database(size):
+    """Return a fresh working copy of a seeded database for this size."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    pristine = os.path.join(DATA_DIR, f"bench-{size}.db")
+    working = os.path.join(DATA_DIR, f"bench-{size}-run.db")
+    if not os.path.exists(pristine):
+        env = dict(os.environ, DATABASE_URL="sqlite:///" + pristine)
+        users, books, reviews = SIZES[size]
+        subprocess.run(
+            [sys.executable, "seed.py", "--users", str(users), "--books", str(books), "--reviews", str(reviews)],
+            cwd=SERVER, env=env, check=True,
+        )
+    # the backup API includes pages still in the seed's WAL file
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(working + suffix):
+            os.remove(working + suffix)
+    with closing(sqlite3.connect(pristine)) as source, closing(sqlite3.connect(working)) as target:
+        source.backup(target)
+    # cached seeds may predate newer migrations
+    subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "app", "upgrade-db"],
+        cwd=SERVER, env=dict(os.environ, DATABASE_URL="sqlite:///" + working), check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return working
+
+
+# ---- SCENARIOS ----
+class Scenario:
+    """One route under test. `request(i)` returns (method, path, json body)."""
+
+    def __init__(self, name, request, iterations, heavy=False):
+        self.name = name
+        self.request = request
+        self.iterations = iterations
+        self.heavy = heavy
+
+
+def scenarios(size, targets):
+    users, books, reviews = SIZES[size]
+    # Full, unpaginated listings grow with the dataset; run fewer of them.
+    full = {"1k": 50, "100k": 5, "1m": 1}[size]
+    own_book, own_review = targets["book"], targets["review"]
+    deletable_books, deletable_reviews = targets["delete_books"], targets["delete_reviews"]
+    return [
+        Scenario("POST /login", lambda i: ("POST", "/login", {"username": "user1", "password": PASSWORD}), 20),
+        Scenario("GET /books", lambda i: ("GET", "/books", None), full, heavy=True),
+        Scenario("GET /books uncached", lambda i: ("GET", f"/books?_={i}", None), full, heavy=True),
+        Scenario("GET /books?limit=50", lambda i: ("GET", f"/books?limit=50&_={i}", None), 200),
+        Scenario("GET /books?limit=50&sort=-year_published",
+                 lambda i: ("GET", f"/books?limit=50&sort=-year_published&_={i}", None), 200),
+        Scenario("GET /books/top", lambda i: ("GET", f"/books/top?by=rating&_={i}", None), 200),
+        Scenario("GET /books/search", lambda i: ("GET", f"/books/search?q=dragon&_={i}", None), 200),
+        Scenario("GET /reviews", lambda i: ("GET", "/reviews", None), full, heavy=True),
+        Scenario("GET /reviews uncached", lambda i: ("GET", f"/reviews?_={i}", None), full, heavy=True),
+        Scenario("GET /reviews?limit=50", lambda i: ("GET", f"/reviews?limit=50&_={i}", None), 200),
+        Scenario("GET /reviews?book_id", lambda i: ("GET", f"/reviews?book_id={1 + i % books}&_={i}", None), 200),
+        Scenario("GET /users/<id>", lambda i: ("GET", f"/users/{1 + i % users}?_={i}", None), 200),
+        Scenario("GET /me", lambda i: ("GET", "/me", None), 200),
+        Scenario("POST /books", lambda i: ("POST", "/books", {
+            "title": f"Bench {i}", "author": "Bench", "year_published": 2000, "description": "bench"}), 100),
+        Scenario("PATCH /books/<id>", lambda i: ("PATCH", f"/books/{own_book}", {"title": f"Bench {i}"}), 100),
+        Scenario("DELETE /books/<id>", lambda i: ("DELETE", f"/books/{deletable_books[i]}", None),
+                 len(deletable_books)),
+        Scenario("POST /reviews", lambda i: ("POST", "/reviews", {
+            "rating": 1 + i % 5, "comment": "bench", "book_id": 1 + i % books}), 100),
+        Scenario("PATCH /reviews/<id>", lambda i: ("PATCH", f"/reviews/{own_review}", {"rating": 1 + i % 5}), 100),
+        Scenario("DELETE /reviews/<id>", lambda i: ("DELETE", f"/reviews/{deletable_reviews[i]}", None),
+                 len(deletable_reviews)),
+        Scenario("GET /health", lambda i: ("GET", "/health", None), 200),
+    ]
+
+
+def create_targets(app, count=100):
+    """Rows owned by user1 for the PATCH and DELETE scenarios."""
+    from sqlalchemy import insert, select
+    from models import db, Book, Review
+
+    with app.app_context():
+        def add_books(n):
+            db.session.execute(insert(Book), [
+                {"title": "Target", "author": "Bench", "year_published": 2000, "description": "x", "user_id": 1}
+                for _ in range(n)
+            ])
+            return list(db.session.scalars(select(Book.id).order_by(Book.id.desc()).limit(n)))
+
+        def add_reviews(n, book_id):
+            db.session.execute(insert(Review), [
+                {"rating": 3, "comment": "target", "user_id": 1, "book_id": book_id} for _ in range(n)
+            ])
+            return list(db.session.scalars(select(Review.id).order_by(Review.id.desc()).limit(n)))
+
+        books = add_books(count + 1)
+        reviews = add_reviews(count + 1, books[-1])
+        db.session.commit()
+        return {
+            "book": books[-1],
+            "review": reviews[-1],
+            "delete_books": books[:count],
+            "delete_reviews": reviews[:count],
+        }
+
+
+# ---- STATS ----
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors, queries=None):
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+    }
+    if queries is not None:
+        result["queries_per_request"] = max(queries)
+    return result
+
+
+def peak_rss_kb(pid=None):
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+# ---- DRIVERS ----
+def run_test_client(app, plan, token):
+    from sqlalchemy import event
+    from models import db
+
+    counter = {"n": 0}
+    with app.app_context():
+        engine = db.engine
+
+    def count(*args):
+        counter["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    try:
+        for scenario in plan:
+            latencies, queries, errors = [], [], 0
+            started = time.perf_counter()
+            for i in range(scenario.iterations):
+                method, path, body = scenario.request(i)
+                counter["n"] = 0
+                start = time.perf_counter()
+                response = client.open(path, method=method, json=body, headers=headers)
+                response.get_data()
+                latencies.append(time.perf_counter() - start)
+                queries.append(counter["n"])
+                if response.status_code >= 400:
+                    errors += 1
+            results[scenario.name] = summarize(latencies, time.perf_counter() - started, errors, queries)
+            print(f"  {scenario.name:<45} p50 {results[scenario.name]['p50_ms']:>9.2f} ms  "
+                  f"queries {results[scenario.name]['queries_per_request']}")
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return {"routes": results, "peak_rss_kb": peak_rss_kb()}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _worker_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [int(p) for p in children.read().split()]
+    except OSError:
+        return []
+
+
+def run_gunicorn(db_path, plan, token, workers, threads, concurrency):
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + db_path)
+    # same worker class as the Procfile
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--worker-class", "gthread", "--threads", str(threads),
+         "--log-level", "warning"],
+        cwd=SERVER, env=env,
+    )
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/health")
+                conn.getresponse().read()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+
+        results = {}
+        peak = {}
+        for scenario in plan:
+            jobs = queue.Queue()
+            for i in range(scenario.iterations):
+                jobs.put(i)
+            latencies, lock, errors = [], threading.Lock(), [0]
+
+            def worker():
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+                while True:
+                    try:
+                        i = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    method, path, body = scenario.request(i)
+                    payload = json.dumps(body) if body is not None else None
+                    start = time.perf_counter()
+                    try:
+                        conn.request(method, path, body=payload, headers=headers)
+                        response = conn.getresponse()
+                        response.read()
+                        status = response.status
+                    except (OSError, http.client.HTTPException):
+                        conn.close()
+                        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=300)
+                        status = 599
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        if status >= 400:
+                            errors[0] += 1
+
+            # Mutations on the same row are serialized to keep results comparable.
+            clients = [threading.Thread(target=worker)
+                       for _ in range(1 if scenario.name.startswith(("PATCH", "DELETE")) else concurrency)]
+            started = time.perf_counter()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            results[scenario.name] = summarize(latencies, time.perf_counter() - started, errors[0])
+            print(f"  {scenario.name:<45} p50 {results[scenario.name]['p50_ms']:>9.2f} ms  "
+                  f"{results[scenario.name]['throughput_rps']} req/s")
+            for pid in [server.pid] + _worker_pids(server.pid):
+                rss = peak_rss_kb(pid)
+                if rss is not None:
+                    peak[pid] = max(peak.get(pid, 0), rss)
+        return {
+            "routes": results,
+            "workers": workers,
+            "threads": threads,
+            "concurrency": concurrency,
+            "peak_rss_kb": max(peak.values()) if peak else None,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# ---- BASELINE ----
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for mode, current in results["modes"].items():
+        previous = baseline.get("modes", {}).get(mode)
+        if not previous:
+            continue
+        for route, now in current["routes"].items():
+            before = previous["routes"].get(route)
+            if not before:
+                continue
+            if now["p95_ms"] > before["p95_ms"] * (1 + tolerance) and now["p95_ms"] - before["p95_ms"] > 1:
+                regressions.append(f"{mode} {route}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+            if now.get("queries_per_request", 0) > before.get("queries_per_request", now.get("queries_per_request", 0)):
+                regressions.append(
+                    f"{mode} {route}: queries {before['queries_per_request']} -> {now['queries_per_request']}"
+                )
+        if previous.get("peak_rss_kb") and current.get("peak_rss_kb") and \
+                current["peak_rss_kb"] > previous["peak_rss_kb"] * (1 + tolerance):
+            regressions.append(f"{mode} peak RSS {previous['peak_rss_kb']} -> {current['peak_rss_kb']} KB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=sorted(SIZES), default="1k")
+    parser.add_argument("--mode", choices=["client", "gunicorn", "both"], default="client")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers (Procfile: 1, the default)")
+    parser.add_argument("--threads", type=int, default=4, help="gthread threads per worker (Procfile: 4)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="results file (default benchmarks/results/<size>.json)")
+    parser.add_argument("--baseline", help="baseline file (default benchmarks/baseline-<size>.json)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95/RSS growth, 0.25 = 25%%")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    db_path = prepare_database(args.size)
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    # one client and one token drive every route; rate limits would skew it
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+    sys.path.insert(0, SERVER)
+    from flask_jwt_extended import create_access_token
+    from app import create_app
+
+    app = create_app()
+    targets = create_targets(app)
+    with app.app_context():
+        token = create_access_token(identity=1)
+
+    results = {"size": args.size, "rows": dict(zip(("users", "books", "reviews"), SIZES[args.size])), "modes": {}}
+    if args.mode in ("client", "both"):
+        print("Flask test client")
+        results["modes"]["client"] = run_test_client(app, scenarios(args.size, targets), token)
+    if args.mode in ("gunicorn", "both"):
+        # gunicorn gets its own delete targets; the test client consumed the first set
+        targets = create_targets(app)
+        print(f"gunicorn ({args.workers} gthread workers x {args.threads} threads, "
+              f"{args.concurrency} concurrent clients)")
+        results["modes"]["gunicorn"] = run_gunicorn(
+            db_path, scenarios(args.size, targets), token, args.workers, args.threads, args.concurrency
+        )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.size}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}")
+
+    baseline_path = args.baseline or os.path.join(HERE, f"baseline-{args.size}.json")
+    if args.update_baseline:
+        shutil.copyfile(output, baseline_path)
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --update-baseline and commit it")
+        return 1
+    with open(baseline_path) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("REGRESSIONS:")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Book search latency as the books table grows.
+
+Selective queries (a title word shared by a handful of books) should stay
+flat as the table grows, while the unindexed LIKE scan grows linearly.
+Broad queries cost time proportional to the number of matches, since every
+match must be ranked.
+
+Run from server/:  python -m benchmarks.bench_search [sizes...]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+WORDS = (
+    "dragon empire river shadow garden winter machine ocean crown letter "
+    "silver forest city night storm glass journey secret mirror orchard"
+).split()
+
+
+def _text(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _time(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run(sizes, repeats=30):
+    path = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from sqlalchemy import insert
+    from app import create_app
+    from cli import upgrade_database
+    from models import db, User, Book
+    from search import ranked_book_ids
+
+    app = create_app()
+    rng = random.Random(7)
+    results = []
+    with app.app_context():
+        upgrade_database()
+        db.session.execute(insert(User), [{"username": "bench", "email": "bench@example.com", "password_hash": "x"}])
+        loaded = 0
+        for size in sizes:
+            rows = [
+                {
+                    "title": f"{_text(rng, 2)} vol{i:07d}",
+                    "author": _text(rng, 2),
+                    "year_published": 1900 + i % 120,
+                    "description": _text(rng, 30),
+                    "user_id": 1,
+                }
+                for i in range(loaded, size)
+            ]
+            db.session.execute(insert(Book), rows)
+            db.session.commit()
+            loaded = size
+
+            target = f"vol{rng.randrange(size):07d}"
+            selective = _time(lambda: ranked_book_ids(db.session, target, limit=20), repeats)
+            scan = _time(lambda: Book.query.filter(Book.title.ilike(f"%{target}%")).limit(20).all(), repeats)
+            broad = _time(lambda: ranked_book_ids(db.session, "dragon", limit=20), max(repeats // 10, 3))
+            results.append((size, selective, scan, broad))
+
+    print(f"{'books':>10} {'fts selective ms':>18} {'LIKE scan ms':>14} {'fts broad ms':>14}")
+    for size, selective, scan, broad in results:
+        print(f"{size:>10} {selective:>18.3f} {scan:>14.3f} {broad:>14.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1000, 10000, 100000]
+    run(sizes)
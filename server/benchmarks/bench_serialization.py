@@ -0,0 +1,142 @@
+"""ORM vs Core read path for listing responses.
+
+Times the three stages of a GET listing for the old path (ORM instances,
+to_dict(), Flask's default JSON provider) and the Core read path (plain rows,
+compiled serializers, FastJSONProvider): fetch (SQL plus hydration),
+serialize and JSON encoding. On the Core path the embedded reviews of a
+book listing are queried while serializing, so that stage includes their
+SQL. Both paths must produce the same bytes; the benchmark checks that
+before timing.
+
+Uses the seeded database from bench_endpoints (created on first run).
+
+Run from server/:  python -m benchmarks.bench_serialization [size] [repeats]
+"""
+import os
+import statistics
+import sys
+import time
+
+from benchmarks.bench_endpoints import prepare_database
+
+
+CASES = (
+    ("books, all, include=reviews,user", "books", {}),
+    ("books, limit=200", "books", {"limit": "200"}),
+    ("reviews, all, include=user,book", "reviews", {}),
+    ("reviews, limit=200", "reviews", {"limit": "200"}),
+)
+
+
+# ---- ORM PATH ----
+# The listings' former read path, kept here as the reference: model
+# instances with their relationship graph eager-loaded, then to_dict().
+def orm_page(listing):
+    from loading import load_books, load_reviews
+    from models import Book
+
+    load = load_books if listing.model is Book else load_reviews
+    query = listing.keyset(listing.filter(load(include=listing.include)))
+    return listing.paginate(query, lambda query: query.all())
+
+
+def orm_serialize(listing, item):
+    from models import Book
+
+    data = item.to_dict()
+    if listing.only is not None:
+        data = {k: v for k, v in data.items() if k in listing.only}
+    for name in listing.include:
+        if name == "reviews":
+            data[name] = [review.to_dict(include_relationships=True) for review in item.reviews]
+        elif listing.model is Book:
+            data[name] = item.user.to_dict()
+        elif name == "user" and item.user:
+            data[name] = item.user.to_dict()
+        elif name == "book" and item.book:
+            data[name] = {"id": item.book.id, "title": item.book.title}
+    return data
+
+
+def _median_ms(timings):
+    return statistics.median(timings) * 1000
+
+
+def _measure(app, provider, make_listing, fetch, serialize, repeats):
+    from models import db
+
+    stages = {"fetch": [], "serialize": [], "json": []}
+    body = None
+    for _ in range(repeats):
+        db.session.remove()
+        listing = make_listing()
+        start = time.perf_counter()
+        items, next_cursor = fetch(listing)
+        fetched = time.perf_counter()
+        data = serialize(listing, items)
+        if listing.paginated:
+            data = {"items": data, "next": next_cursor}
+        serialized = time.perf_counter()
+        body = provider.dumps(data, separators=(",", ":"))
+        encoded = time.perf_counter()
+        stages["fetch"].append(fetched - start)
+        stages["serialize"].append(serialized - fetched)
+        stages["json"].append(encoded - serialized)
+    return {name: _median_ms(values) for name, values in stages.items()}, body
+
+
+def run(size="100k", repeats=5):
+    os.environ["DATABASE_URL"] = "sqlite:///" + prepare_database(size)
+    os.environ.setdefault("INSTRUMENTATION_ENABLED", "0")
+
+    from flask.json.provider import DefaultJSONProvider
+    from werkzeug.datastructures import MultiDict
+    from app import create_app
+    from encoding import FastJSONProvider, orjson
+    from listing import BookListing, ReviewListing
+
+    app = create_app()
+    listings = {"books": BookListing, "reviews": ReviewListing}
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    results = []
+    with app.test_request_context():
+        for label, kind, args in CASES:
+            def make_listing():
+                return listings[kind](MultiDict(args))
+
+            orm, orm_body = _measure(
+                app, default_provider, make_listing,
+                orm_page,
+                lambda listing, items: [orm_serialize(listing, item) for item in items],
+                repeats,
+            )
+            core, core_body = _measure(
+                app, fast_provider, make_listing,
+                lambda listing: listing.rows(),
+                lambda listing, rows: listing.serialize_rows(rows),
+                repeats,
+            )
+            if orm_body != core_body:
+                raise SystemExit(f"{label}: Core read path output differs from the ORM path")
+            results.append((label, orm, core, len(orm_body)))
+
+    encoder = "orjson" if orjson is not None else "stdlib"
+    print(f"size {size}, median of {repeats}, fast encoder: {encoder}")
+    print(f"{'case':<34} {'path':<5} {'fetch ms':>10} {'serialize ms':>13} {'json ms':>9} {'total ms':>10}")
+    for label, orm, core, nbytes in results:
+        for path, stages in (("orm", orm), ("core", core)):
+            total = sum(stages.values())
+            print(
+                f"{label:<34} {path:<5} {stages['fetch']:>10.1f} {stages['serialize']:>13.1f} "
+                f"{stages['json']:>9.1f} {total:>10.1f}"
+            )
+        speedup = sum(orm.values()) / max(sum(core.values()), 1e-9)
+        print(f"{'':<34} {nbytes / 1024:.0f} KiB, {speedup:.1f}x faster")
+    return results
+
+
+if __name__ == "__main__":
+    size = sys.argv[1] if len(sys.argv) > 1 else "100k"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    run(size, repeats)
@@ -0,0 +1,119 @@
+"""Build time and memory of the similar-books engine.
+
+`synthetic` (the default) times the NumPy engine alone on generated ratings:
+users rate books drawn from a Zipf-like popularity curve, so popular books
+pull in the large co-rating blocks real data has. It reports the matrix
+build, the scoring pass and the peak traced memory (NumPy allocations are
+traced) at each SIMILAR_PAIR_BUDGET.
+
+`database` runs the full `flask rebuild-similar` job against the seeded
+database from bench_endpoints (loading reviews, scoring, persisting) and
+then times the per-book lookup that /books/<id>/similar serves.
+
+Run from server/:
+    python -m benchmarks.bench_similarity --reviews 1000000
+    python -m benchmarks.bench_similarity --source database --size 100k
+"""
+import argparse
+import os
+import resource
+import statistics
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def synthetic_ratings(reviews, users, books, seed=0):
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, books + 1) ** 0.8
+    popularity /= popularity.sum()
+    user_ids = rng.integers(1, users + 1, reviews)
+    book_ids = rng.choice(np.arange(1, books + 1), size=reviews, p=popularity)
+    # two tastes: users agree with books of their parity, with noise
+    liked = (user_ids % 2) == (book_ids % 2)
+    ratings = np.where(liked, rng.integers(3, 6, reviews), rng.integers(1, 4, reviews))
+    return user_ids, book_ids, ratings.astype(np.float64)
+
+
+def _mib(nbytes):
+    return nbytes / (1024 * 1024)
+
+
+def run_synthetic(reviews, users, books, budgets, k=20, min_common=2, shrinkage=10.0):
+    from similarity import RatingMatrix, top_k
+
+    user_ids, book_ids, ratings = synthetic_ratings(reviews, users, books)
+    print(f"{reviews} reviews, {users} users, {books} books, top {k}")
+    print(f"{'pair budget':>12} {'build s':>8} {'score s':>8} {'blocks':>7} {'pairs':>12} {'peak MiB':>9} {'neighbours':>11}")
+    for budget in budgets:
+        tracemalloc.start()
+        start = time.perf_counter()
+        matrix = RatingMatrix(user_ids, book_ids, ratings)
+        built = time.perf_counter()
+        rows = np.arange(len(matrix.books))
+        blocks = neighbours = 0
+        for block in matrix.blocks(rows, budget):
+            positions, columns, scores = matrix.scores(block, min_common, shrinkage)
+            neighbours += len(top_k(positions, columns, scores, k)[0])
+            blocks += 1
+        scored = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        pairs = int(matrix.pair_counts().sum())
+        print(
+            f"{budget:>12} {built - start:>8.2f} {scored - built:>8.2f} {blocks:>7} {pairs:>12} "
+            f"{_mib(peak):>9.0f} {neighbours:>11}"
+        )
+        del matrix
+    print(f"process max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+
+def run_database(size, lookups=200):
+    from benchmarks.bench_endpoints import prepare_database
+
+    os.environ["DATABASE_URL"] = "sqlite:///" + prepare_database(size)
+    os.environ.setdefault("INSTRUMENTATION_ENABLED", "0")
+
+    from app import create_app
+    from models import db, Book
+    from similarity import rebuild_similarities, similar_to
+
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        books = rebuild_similarities(db.session)
+        elapsed = time.perf_counter() - start
+        print(f"size {size}: rebuild {elapsed:.2f} s for {books} books with neighbours")
+
+        ids = [row[0] for row in db.session.query(Book.id).limit(lookups)]
+        timings = []
+        for book_id in ids:
+            start = time.perf_counter()
+            similar_to(book_id, app.config["SIMILAR_TOP_K"])
+            timings.append(time.perf_counter() - start)
+        print(
+            f"lookup: median {statistics.median(timings) * 1000:.2f} ms, "
+            f"max {max(timings) * 1000:.2f} ms over {len(timings)} books"
+        )
+    print(f"process max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["synthetic", "database"], default="synthetic")
+    parser.add_argument("--reviews", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--budget", type=int, action="append",
+                        help="pair budget to try, repeatable (default 250k, 1M and 4M)")
+    parser.add_argument("--size", default="100k", help="bench_endpoints database size for --source database")
+    args = parser.parse_args()
+    if args.source == "database":
+        run_database(args.size)
+    else:
+        run_synthetic(args.reviews, args.users, args.books, args.budget or [250000, 1000000, 4000000])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import csv
+import io
+import json
+
+from flask import current_app, has_app_context
+from sqlalchemy import insert, select
+
+from models import db, Book, Review
+from aggregates import refresh_book_aggregates
+from similarity import queue_stale_books
+
+
+FORMATS = ("csv", "jsonl")
+
+
+class BulkError(ValueError):
+    pass
+
+
+# ---- PARSING ----
+def read_rows(stream, fmt):
+    """Yield (row_number, record) pairs from a text stream, one line at a time.
+    Undecodable lines yield an Exception in place of the record."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for number, record in enumerate(reader, start=1):
+            yield number, record
+    elif fmt == "jsonl":
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as err:
+                yield number, BulkError(f"Invalid JSON: {err}")
+                continue
+            if not isinstance(record, dict):
+                record = BulkError("Each line must be a JSON object")
+            yield number, record
+    else:
+        raise BulkError(f"Unknown import format '{fmt}'")
+
+
+def detect_format(fmt, content_type):
+    if not fmt:
+        fmt = "csv" if content_type and "csv" in content_type else "jsonl"
+    if fmt not in FORMATS:
+        raise BulkError(f"Unknown import format '{fmt}'")
+    return fmt
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding="utf-8", newline="")
+
+
+# ---- VALIDATION ----
+def _text(record, key, max_length=None):
+    value = record.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise BulkError(f"{key} is required")
+    value = str(value)
+    if max_length and len(value) > max_length:
+        raise BulkError(f"{key} must be at most {max_length} characters")
+    return value
+
+
+def _int(record, key, low=None, high=None):
+    value = record.get(key)
+    if value is None or value == "":
+        raise BulkError(f"{key} is required")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BulkError(f"{key} must be an integer")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise BulkError(f"{key} must be between {low} and {high}")
+    return value
+
+
+def validate_book(record, user_id):
+    return {
+        "title": _text(record, "title", 200),
+        "author": _text(record, "author", 100),
+        "year_published": _int(record, "year_published"),
+        "description": _text(record, "description"),
+        "user_id": user_id,
+    }
+
+
+def validate_review(record, user_id):
+    return {
+        "rating": _int(record, "rating", 1, 5),
+        "comment": _text(record, "comment"),
+        "book_id": _int(record, "book_id"),
+        "user_id": user_id,
+    }
+
+
+# ---- IMPORT ----
+class Importer:
+    """Validates rows as they stream in and inserts them in batches, one
+    executemany INSERT and one transaction per batch."""
+
+    tables = ()
+
+    def __init__(self, model, validate, batch_size=1000, max_errors=1000):
+        self.model = model
+        self.validate = validate
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.errors = []
+        self.error_count = 0
+
+    def error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": number, "error": message})
+
+    def check_batch(self, batch):
+        return batch
+
+    def after_batch(self, rows):
+        pass
+
+    def flush(self, batch):
+        batch = self.check_batch(batch)
+        if not batch:
+            return
+        rows = [row for _, row in batch]
+        try:
+            db.session.execute(insert(self.model), rows)
+            self.after_batch(rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.inserted += len(rows)
+        # Core inserts bypass the ORM flush hooks that retire cached listings
+        cache = current_app.extensions.get("response_cache") if has_app_context() else None
+        if cache is not None:
+            cache.touch(*self.tables)
+
+    def run(self, records, user_id):
+        batch = []
+        for number, record in records:
+            if isinstance(record, Exception):
+                self.error(number, str(record))
+                continue
+            try:
+                batch.append((number, self.validate(record, user_id)))
+            except BulkError as err:
+                self.error(number, str(err))
+                continue
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        return self.result()
+
+    def result(self):
+        errors = sorted(self.errors, key=lambda e: e["row"])
+        return {"inserted": self.inserted, "failed": self.error_count, "errors": errors}
+
+
+class BookImporter(Importer):
+    tables = ("books",)
+
+    def __init__(self, **kwargs):
+        super().__init__(Book, validate_book, **kwargs)
+
+
+class ReviewImporter(Importer):
+    tables = ("books", "reviews")
+
+    def __init__(self, **kwargs):
+        super().__init__(Review, validate_review, **kwargs)
+
+    def check_batch(self, batch):
+        # One IN query per batch to reject reviews of books that don't exist
+        book_ids = {row["book_id"] for _, row in batch}
+        existing = set(db.session.scalars(select(Book.id).where(Book.id.in_(list(book_ids)))))
+        kept = []
+        for number, row in batch:
+            if row["book_id"] in existing:
+                kept.append((number, row))
+            else:
+                self.error(number, f"Book {row['book_id']} does not exist")
+        return kept
+
+    def after_batch(self, rows):
+        # Core inserts skip the aggregate flush hook; recompute the touched
+        # books in the same transaction instead, and queue them for update-similar.
+        books = {row["book_id"] for row in rows}
+        refresh_book_aggregates(db.session, books)
+        queue_stale_books(db.session, books)
+
+
+IMPORTERS = {
+    "books": BookImporter,
+    "reviews": ReviewImporter,
+}
@@ -0,0 +1,293 @@
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, g, has_app_context, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from compression import representation_etag
+
+
+class CachedResponse:
+    def __init__(self, versions, etag, body, mimetype):
+        self.versions = versions
+        self.etag = etag
+        self.body = body
+        self.mimetype = mimetype
+        self.encoded = {}  # content-coding -> compressed body, filled on demand
+        self.created = time.time()
+
+    def __setstate__(self, state):
+        # entries pickled before compressed bodies were stored have none, and
+        # entries from before the TTL count as expired
+        state.setdefault("encoded", {})
+        state.setdefault("created", 0.0)
+        self.__dict__.update(state)
+
+
+# ---- BACKENDS ----
+class MemoryBackend:
+    """In-process LRU. Versions are per process, so use it with one worker."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.table_versions = {}
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def versions(self, tables):
+        with self.lock:
+            return tuple(self.table_versions.get(t, 0) for t in tables)
+
+    def bump(self, tables):
+        with self.lock:
+            for t in tables:
+                self.table_versions[t] = self.table_versions.get(t, 0) + 1
+
+    def size(self):
+        return len(self.entries)
+
+
+class SQLiteBackend:
+    """LRU and version counters in a shared SQLite file, so every gunicorn
+    worker on the host sees the same versions and entries."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        with self._conn() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def set(self, key, entry):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, used) VALUES (?, ?, ?)",
+                (key, pickle.dumps(entry), time.time()),
+            )
+            evicted = conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.evictions += max(evicted, 0)
+
+    def versions(self, tables):
+        conn = self._conn()
+        placeholders = ",".join("?" * len(tables))
+        rows = dict(conn.execute(
+            f"SELECT name, version FROM versions WHERE name IN ({placeholders})", tuple(tables)
+        ).fetchall())
+        return tuple(rows.get(t, 0) for t in tables)
+
+    def bump(self, tables):
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT INTO versions (name, version) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+                [(t,) for t in tables],
+            )
+
+    def size(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def make_backend(url, max_entries):
+    if url == "memory://":
+        return MemoryBackend(max_entries)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):], max_entries)
+    raise ValueError(f"Unsupported RESPONSE_CACHE_URL '{url}'")
+
+
+# ---- RESPONSE CACHE ----
+class ResponseCache:
+    """Caches GET responses keyed on path and query string. Each entry records
+    the version of the tables it was built from; a commit touching any of
+    them bumps the version and retires the entry. Entries also expire after
+    RESPONSE_CACHE_TTL seconds, which bounds how long a process keeps serving
+    an entry when the write happened where its version bump could not reach
+    (another worker or a CLI job, with the per-process memory:// backend)."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = make_backend(
+            app.config["RESPONSE_CACHE_URL"],
+            app.config["RESPONSE_CACHE_MAX_ENTRIES"],
+        )
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+        app.extensions["response_cache"] = self
+
+    def touch(self, *tables):
+        """Bump table versions for writes that bypass the ORM flush."""
+        self.backend.bump(tables)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.backend.evictions,
+            "entries": self.backend.size(),
+        }
+
+    def _key(self):
+        # re-encoded, so a value containing "&" or "=" cannot pose as other arguments
+        return request.path + "?" + urlencode(sorted(request.args.items(multi=True)))
+
+    def _fresh(self, entry, versions):
+        if entry.versions != versions:
+            return False
+        return not self.ttl or time.time() - entry.created < self.ttl
+
+    def _respond(self, key, entry):
+        compression = current_app.extensions.get("compression")
+        encoding = compression.negotiate(entry.body, entry.mimetype) if compression else None
+        etag = representation_etag(entry.etag, encoding)
+        if request.if_none_match.contains_weak(etag):
+            self.not_modified += 1
+            response = make_response("", 304)
+        elif encoding is None:
+            response = make_response(entry.body)
+            response.mimetype = entry.mimetype
+        else:
+            compressed = entry.encoded.get(encoding)
+            if compressed is None:
+                compressed = entry.encoded[encoding] = compression.compress(encoding, entry.body)
+                self.backend.set(key, entry)
+            else:
+                compression.record_cached(encoding, entry.body, compressed)
+            response = make_response(compressed)
+            response.mimetype = entry.mimetype
+            response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        if compression is not None and compression.compressible(entry.mimetype):
+            # a 304 too: it answers for one encoding's validator
+            response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    def _lookup(self, tables):
+        key = self._key()
+        versions = self.backend.versions(tables)
+        entry = self.backend.get(key)
+        if entry is not None and not self._fresh(entry, versions):
+            entry = None
+        return key, versions, entry
+
+    def lookup(self, tables):
+        """The fresh entry for this request, or None. For callers that run
+        before the view (admission control); the view reuses the answer."""
+        g._response_cache_lookup = self._lookup(tables)
+        return g._response_cache_lookup[2]
+
+    def cached(self, *tables):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key, versions, entry = g.pop("_response_cache_lookup", None) or self._lookup(tables)
+                if entry is not None:
+                    self.hits += 1
+                    return self._respond(key, entry)
+
+                self.misses += 1
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                router = current_app.extensions.get("replicas")
+                if router is not None and router.served_from_replica() and router.recently_written():
+                    # the replica may not have the write that bumped the versions yet
+                    return response
+                body = response.get_data()
+                entry = CachedResponse(
+                    versions, hashlib.sha256(body).hexdigest()[:32], body, response.mimetype
+                )
+                self.backend.set(key, entry)
+                return self._respond(key, entry)
+            wrapper.cache_tables = tables
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
+
+
+def mark_changed(session, *tables):
+    """Record tables written with Core statements, which the flush hook below
+    cannot see; their versions are bumped when the session commits."""
+    session.info.setdefault("changed_tables", set()).update(tables)
+
+
+# Track which tables each flush writes and bump their versions once the
+# transaction commits; a rollback discards the pending set.
+@event.listens_for(Session, "after_flush")
+def _record_changed_tables(session, flush_context):
+    changed = session.info.setdefault("changed_tables", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            changed.add(table)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed_tables(session):
+    changed = session.info.pop("changed_tables", None)
+    if changed and has_app_context():
+        cache = current_app.extensions.get("response_cache")
+        if cache is not None:
+            cache.touch(*changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+    session.info.pop("changed_tables", None)
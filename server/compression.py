@@ -0,0 +1,165 @@
+import gzip
+import threading
+import time
+
+from flask import request
+
+from instrumentation import timed
+
+# brotli and zstd are optional; without their libraries only gzip is offered
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/plain", "text/csv")
+
+
+def representation_etag(etag, encoding):
+    """Each encoding of a body is its own representation with its own bytes,
+    so it gets its own strong validator: "<tag>-gzip", "<tag>-br", ..."""
+    return etag if encoding is None else f"{etag}-{encoding}"
+
+
+def _codecs(config):
+    """Available encodings, most preferred first, as name -> compress(bytes)."""
+    codecs = {}
+    if zstandard is not None:
+        level = config["COMPRESS_LEVEL_ZSTD"]
+        local = threading.local()  # ZstdCompressor instances aren't thread safe
+
+        def zstd(data):
+            compressor = getattr(local, "compressor", None)
+            if compressor is None:
+                compressor = local.compressor = zstandard.ZstdCompressor(level=level)
+            return compressor.compress(data)
+
+        codecs["zstd"] = zstd
+    if brotli is not None:
+        level = config["COMPRESS_LEVEL_BROTLI"]
+        codecs["br"] = lambda data: brotli.compress(data, quality=level)
+    level = config["COMPRESS_LEVEL_GZIP"]
+    codecs["gzip"] = lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+    return codecs
+
+
+class EncodingStats:
+    __slots__ = ("responses", "cached", "bytes_in", "bytes_out", "cpu_seconds")
+
+    def __init__(self):
+        self.responses = 0
+        self.cached = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+
+class Compression:
+    """Negotiated response compression (zstd, br, gzip) for text bodies of
+    at least COMPRESS_MIN_SIZE bytes.
+
+    Cached responses keep their compressed bodies next to the entry (see
+    ResponseCache), so repeated reads only pay for compression once per
+    encoding. Counters report bytes in and out and the CPU time spent, to
+    weigh bandwidth saved against worker CPU."""
+
+    def __init__(self, app=None):
+        self.codecs = {}
+        self.lock = threading.Lock()
+        self.encodings = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config["COMPRESS_ENABLED"]
+        self.min_size = app.config["COMPRESS_MIN_SIZE"]
+        self.codecs = _codecs(app.config) if self.enabled else {}
+        self.encodings = {name: EncodingStats() for name in self.codecs}
+        app.extensions["compression"] = self
+        if self.enabled:
+            app.after_request(self._after_request)
+
+    def compressible(self, mimetype):
+        return self.enabled and mimetype in COMPRESSIBLE
+
+    def negotiate(self, body, mimetype):
+        """The encoding to send `body` with for this request, or None."""
+        if not self.compressible(mimetype) or len(body) < self.min_size:
+            return None
+        return request.accept_encodings.best_match(list(self.codecs))
+
+    def compress(self, encoding, body):
+        start = time.thread_time()
+        with timed("compress"):
+            compressed = self.codecs[encoding](body)
+        cpu = time.thread_time() - start
+        with self.lock:
+            stats = self.encodings[encoding]
+            stats.responses += 1
+            stats.bytes_in += len(body)
+            stats.bytes_out += len(compressed)
+            stats.cpu_seconds += cpu
+        return compressed
+
+    def record_cached(self, encoding, body, compressed):
+        with self.lock:
+            stats = self.encodings[encoding]
+            stats.responses += 1
+            stats.cached += 1
+            stats.bytes_in += len(body)
+            stats.bytes_out += len(compressed)
+
+    @staticmethod
+    def apply(response, encoding, compressed):
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag(representation_etag(etag, encoding), weak=weak)
+
+    def _after_request(self, response):
+        if not self.compressible(response.mimetype):
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.status_code in (204, 206, 304)
+        ):
+            return response
+        body = response.get_data()
+        encoding = self.negotiate(body, response.mimetype)
+        if encoding is not None:
+            self.apply(response, encoding, self.compress(encoding, body))
+        return response
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for name, encoding in self.encodings.items():
+                stats[name] = {
+                    "responses": encoding.responses,
+                    "cached": encoding.cached,
+                    "bytes_in": encoding.bytes_in,
+                    "bytes_out": encoding.bytes_out,
+                    "ratio": round(encoding.bytes_out / encoding.bytes_in, 4) if encoding.bytes_in else None,
+                    "cpu_seconds": round(encoding.cpu_seconds, 6),
+                }
+        return stats
+
+    def gauges(self):
+        return {
+            f"{name}_{key}": value
+            for name, stats in self.stats().items()
+            for key, value in stats.items()
+        }
+
+
+compression = Compression()
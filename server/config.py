@@ -1,8 +1,107 @@
 
 import os
 
+
+def database_uri():
+    uri = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3')
+    # Heroku/Render style URLs use the scheme SQLAlchemy dropped
+    if uri.startswith('postgres://'):
+        uri = uri.replace('postgres://', 'postgresql://', 1)
+    return uri
+
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///db.sqlite3')
+    SQLALCHEMY_DATABASE_URI = database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'super-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # in seconds, equals 1 hour
+    PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', 50))
+    PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', 200))
+    PROFILE_PAGE_SIZE = int(os.getenv('PROFILE_PAGE_SIZE', 10))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    # memory:// is per process; point every worker at the same
+    # sqlite:///path file when running gunicorn with several workers.
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', 'memory://')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 512))
+    # Upper bound on an entry's age (0 = none). Writes made in another process
+    # only reach a memory:// cache this way, so it is how stale a worker can be
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 60))
+    BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', 1000))
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 1000))
+    # werkzeug method string, e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000.
+    # Stored hashes with other parameters are upgraded on the next login.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Hashes running plus waiting stay below the Procfile's 4 threads, so
+    # a login burst is answered 503 instead of taking every thread
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 1))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+    # Engine profile: sqlite, postgres or default; picked from the URL if unset
+    DB_ENGINE_PROFILE = os.getenv('DB_ENGINE_PROFILE')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64000))  # negative = KiB
+    INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', '1') == '1'
+    SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+    # /sync re-sends changes this many seconds before the previous token to
+    # cover transactions that committed after the previous read
+    SYNC_SAFETY_WINDOW_SECONDS = float(os.getenv('SYNC_SAFETY_WINDOW_SECONDS', 5))
+    # Older tombstones are pruned; clients further behind get a full sync
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+    # Rows of each kind per /sync page, snapshot or delta (default and maximum)
+    SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', 1000))
+    # Negotiated zstd/br/gzip for JSON and text bodies of at least
+    # COMPRESS_MIN_SIZE bytes; zstd and br need the zstandard and brotli packages
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL_GZIP = int(os.getenv('COMPRESS_LEVEL_GZIP', 6))
+    COMPRESS_LEVEL_BROTLI = int(os.getenv('COMPRESS_LEVEL_BROTLI', 5))
+    COMPRESS_LEVEL_ZSTD = int(os.getenv('COMPRESS_LEVEL_ZSTD', 3))
+    # Comma-separated read replica URLs for routes marked @replicas.reads
+    DATABASE_REPLICA_URLS = os.getenv('DATABASE_REPLICA_URLS', '')
+    REPLICA_STRATEGY = os.getenv('REPLICA_STRATEGY', 'round_robin')  # or least_busy
+    # Reads stay on the primary this long after a user's own write; should
+    # exceed the usual replica lag. Tracked per worker process (see replicas.py)
+    REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    REPLICA_HEALTH_INTERVAL = float(os.getenv('REPLICA_HEALTH_INTERVAL', 5))
+    REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', 30))
+    # Similar books (similarity.py): neighbours kept per book, co-raters
+    # needed before two books count as similar, and the shrinkage that damps
+    # scores backed by few co-raters (n / (n + shrinkage))
+    SIMILAR_TOP_K = int(os.getenv('SIMILAR_TOP_K', 20))
+    SIMILAR_MIN_COMMON = int(os.getenv('SIMILAR_MIN_COMMON', 2))
+    SIMILAR_SHRINKAGE = float(os.getenv('SIMILAR_SHRINKAGE', 10))
+    # Rating products scored per block; bounds the rebuild's peak memory
+    SIMILAR_PAIR_BUDGET = int(os.getenv('SIMILAR_PAIR_BUDGET', 1000000))
+    # Proxies in front of the app (Render's load balancer is one) whose
+    # X-Forwarded-For entries are trusted for the client address; 0 when
+    # clients connect directly, or they could pick their own address
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 1))
+    # Admission control (admission.py): token buckets per client IP, per JWT
+    # identity and, for login/signup/refresh, a tighter per-IP auth bucket
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') == '1'
+    # memory:// is per process; sqlite:///path or redis://host share limits
+    # between workers
+    ADMISSION_URL = os.getenv('ADMISSION_URL', 'memory://')
+    RATE_LIMIT_IP_PER_SECOND = float(os.getenv('RATE_LIMIT_IP_PER_SECOND', 50))
+    RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', 200))
+    RATE_LIMIT_USER_PER_SECOND = float(os.getenv('RATE_LIMIT_USER_PER_SECOND', 10))
+    RATE_LIMIT_USER_BURST = float(os.getenv('RATE_LIMIT_USER_BURST', 50))
+    RATE_LIMIT_AUTH_PER_SECOND = float(os.getenv('RATE_LIMIT_AUTH_PER_SECOND', 1))
+    RATE_LIMIT_AUTH_BURST = float(os.getenv('RATE_LIMIT_AUTH_BURST', 10))
+    # Requests in progress per route class (0 = no cap), per process with
+    # memory:// and across workers otherwise. Cache hits take no slot. The
+    # auth and heavy caps stay below the Procfile's 4 threads, so a login
+    # storm or a spike of uncached listings always leaves a thread for
+    # everything else; auth also queues behind the hash pool
+    ADMISSION_MAX_AUTH = int(os.getenv('ADMISSION_MAX_AUTH', 2))
+    ADMISSION_MAX_HEAVY = int(os.getenv('ADMISSION_MAX_HEAVY', 3))
+    ADMISSION_MAX_WRITE = int(os.getenv('ADMISSION_MAX_WRITE', 8))
+    ADMISSION_MAX_READ = int(os.getenv('ADMISSION_MAX_READ', 0))
+    # A shared slot held by a worker that died is reclaimed after this long
+    ADMISSION_SLOT_TTL = float(os.getenv('ADMISSION_SLOT_TTL', 60))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
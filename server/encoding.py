@@ -0,0 +1,55 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+
+COMPACT = {"separators": (",", ":")}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with the same output bytes, encoded faster.
+
+    Compact output (jsonify and other responses) goes through orjson when it
+    is installed. Its result is only used when it is ASCII, so escaping stays
+    identical to ensure_ascii; anything orjson can't encode falls back to
+    the stdlib. The stdlib encoders are built once rather than per call.
+    ensure_ascii and sort_keys are read when the provider is created.
+
+    One difference remains: orjson writes NaN and Infinity (not valid JSON)
+    as null."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        options = dict(default=self.default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys)
+        self.encoder = json.JSONEncoder(**options)
+        self.compact_encoder = json.JSONEncoder(**options, **COMPACT)
+        self.orjson_options = 0
+        if orjson is not None:
+            # datetimes, dataclasses and subclasses go through default() as
+            # they do with the stdlib, so they serialize the same way
+            self.orjson_options = (
+                orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_PASSTHROUGH_SUBCLASS
+            )
+            if self.sort_keys:
+                self.orjson_options |= orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return self.encoder.encode(obj)
+        if kwargs != COMPACT:
+            return super().dumps(obj, **kwargs)
+        if orjson is not None:
+            try:
+                encoded = orjson.dumps(obj, default=self.default, option=self.orjson_options)
+            except TypeError:  # includes orjson.JSONEncodeError
+                pass
+            else:
+                if not self.ensure_ascii or encoded.isascii():
+                    return encoded.decode()
+        return self.compact_encoder.encode(obj)
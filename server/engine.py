@@ -0,0 +1,150 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+
+# Upper bounds (seconds) of the checkout-wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def record(self, wait, checked_out, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if wait <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+            else:
+                self.wait_buckets[-1] += 1
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait and how close the pool
+    runs to its limit, so pool size per worker can be set from data."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, self.checkedout(), timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start, self.checkedout())
+        return connection
+
+    def snapshot(self):
+        stats = self.stats
+        capacity = self.size() + self._max_overflow if self._max_overflow >= 0 else None
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "peak_checked_out": stats.peak_checked_out,
+            "saturation": round(stats.peak_checked_out / capacity, 3) if capacity else None,
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_avg_ms": round(stats.wait_total / stats.checkouts * 1000, 3) if stats.checkouts else 0.0,
+            "wait_max_ms": round(stats.wait_max * 1000, 3),
+        }
+
+
+# ---- PROFILES ----
+def detect_profile(uri):
+    if uri.startswith("sqlite"):
+        # in-memory databases keep Flask-SQLAlchemy's single shared connection
+        in_memory = ":memory:" in uri or uri in ("sqlite://", "sqlite:///")
+        return "default" if in_memory else "sqlite"
+    if uri.startswith("postgresql"):
+        return "postgres"
+    return "default"
+
+
+def engine_options(config, uri=None):
+    """SQLALCHEMY_ENGINE_OPTIONS for the DB_ENGINE_PROFILE (or the profile
+    implied by the database URL, `uri` when given)."""
+    profile = config["DB_ENGINE_PROFILE"] or detect_profile(uri or config["SQLALCHEMY_DATABASE_URI"])
+    if profile == "postgres":
+        return {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT"],
+            "pool_recycle": config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": True,
+        }
+    if profile == "sqlite":
+        return {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT"],
+            "connect_args": {"check_same_thread": False},
+        }
+    return {}
+
+
+def sqlite_pragmas(config):
+    return (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    )
+
+
+def init_engine(app, db):
+    """Attach per-connection setup to the engine created by db.init_app()."""
+    with app.app_context():
+        configure_engine(db.engine, app.config)
+
+
+def configure_engine(engine, config):
+    if engine.dialect.name == "sqlite":
+        # SQLite ignores foreign keys, ON DELETE CASCADE included, unless
+        # each connection turns them on; the tuning pragmas are for the
+        # pooled file profile
+        pragmas = ("PRAGMA foreign_keys=ON",)
+        if isinstance(engine.pool, InstrumentedQueuePool):
+            pragmas += sqlite_pragmas(config)
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.snapshot()
+    return {"status": pool.status()}
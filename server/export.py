@@ -0,0 +1,45 @@
+from flask import Response, current_app, stream_with_context
+
+from encoding import COMPACT
+from listing import ListingError
+from rows import execute
+
+
+FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _items(listing):
+    # yield_per streams rows from the cursor in fixed-size batches; each batch
+    # is serialized, embedded relations included, before the next is fetched.
+    batch_size = current_app.config["EXPORT_BATCH_SIZE"]
+    result = execute(listing.select(), yield_per=batch_size)
+    for partition in result.partitions():
+        yield from listing.serialize_rows(partition)
+
+
+def _json_array(listing):
+    # compact output is what FastJSONProvider hands to orjson
+    dumps = current_app.json.dumps
+    yield "["
+    separator = ""
+    for item in _items(listing):
+        yield separator + dumps(item, **COMPACT)
+        separator = ","
+    yield "]"
+
+
+def _ndjson(listing):
+    dumps = current_app.json.dumps
+    for item in _items(listing):
+        yield dumps(item, **COMPACT) + "\n"
+
+
+def export_response(listing, fmt):
+    """Stream every row matched by a listing as a chunked JSON array or NDJSON."""
+    if fmt not in FORMATS:
+        raise ListingError(f"Unknown export format '{fmt}'")
+    body = _ndjson(listing) if fmt == "ndjson" else _json_array(listing)
+    return Response(stream_with_context(body), mimetype=FORMATS[fmt])
@@ -0,0 +1,219 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from encoding import FastJSONProvider
+
+
+# Histogram bucket upper bounds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+SLOWEST_KEPT = 3
+
+
+class RequestMetrics:
+    __slots__ = ("start", "queries", "sql_time", "slowest", "phases")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest = []
+        self.phases = {}
+
+    def add_query(self, statement, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.slowest) < SLOWEST_KEPT or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def add_phase(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+
+def current_metrics():
+    if has_request_context():
+        return g.get("_metrics")
+    return None
+
+
+@contextmanager
+def timed(phase):
+    """Attribute the enclosed block's time to a named phase of the request."""
+    metrics = current_metrics()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(phase, time.perf_counter() - start)
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """The app's JSON provider, with encoding time recorded as the 'json' phase."""
+
+    def dumps(self, obj, **kwargs):
+        with timed("json"):
+            return super().dumps(obj, **kwargs)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.total:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class Instrumentation:
+    """Per-request SQL count, SQL/serialization/total timings, a Server-Timing
+    header, a slow-request log and per-route Prometheus histograms.
+
+    Histograms are per process; with several gunicorn workers each scrape
+    reports the worker that served it."""
+
+    def __init__(self, app=None, db=None):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.gauges = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.routes = {}
+        self.gauges = []
+        self.enabled = app.config["INSTRUMENTATION_ENABLED"]
+        self.slow_seconds = app.config["SLOW_REQUEST_MS"] / 1000.0
+        self.logger = app.logger
+        app.extensions["instrumentation"] = self
+        if not self.enabled:
+            return
+        app.json = TimedJSONProvider(app)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        with app.app_context():
+            self.watch(db.engine)
+
+    def watch(self, engine):
+        """Count and time the statements run on `engine`."""
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def add_gauges(self, name, help_text, collect):
+        """Export `collect()` -> {label: number} as a gauge on /metrics."""
+        self.gauges.append((name, help_text, collect))
+
+    # ---- hooks ----
+    # The start time lives on the statement's execution context, which is
+    # dropped with it, so a statement that fails leaves nothing behind.
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.add_query(statement, time.perf_counter() - context._query_start)
+
+    def _before_request(self):
+        g._metrics = RequestMetrics()
+
+    def _after_request(self, response):
+        metrics = g.pop("_metrics", None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics.start
+        phases = metrics.phases
+        timings = [f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"']
+        if "orm" in phases:
+            hydrate = max(phases["orm"] - metrics.sql_time, 0.0)
+            timings.append(f"hydrate;dur={hydrate * 1000:.1f}")
+        for name in ("serialize", "json", "compress"):
+            if name in phases:
+                timings.append(f"{name};dur={phases[name] * 1000:.1f}")
+        timings.append(f"total;dur={total * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(timings)
+
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        self._observe(request.method, route, response.status_code, total, metrics)
+        if total >= self.slow_seconds:
+            self._log_slow(route, total, metrics)
+        return response
+
+    def _observe(self, method, route, status, total, metrics):
+        key = (method, route, str(status)[0] + "xx")
+        with self.lock:
+            histograms = self.routes.get(key)
+            if histograms is None:
+                histograms = self.routes[key] = (
+                    Histogram(DURATION_BUCKETS),
+                    Histogram(DURATION_BUCKETS),
+                    Histogram(QUERY_BUCKETS),
+                )
+            histograms[0].observe(total)
+            histograms[1].observe(metrics.sql_time)
+            histograms[2].observe(metrics.queries)
+
+    def _log_slow(self, route, total, metrics):
+        statements = "; ".join(
+            f"{duration * 1000:.1f}ms {' '.join(statement.split())[:200]}"
+            for duration, statement in metrics.slowest
+        )
+        self.logger.warning(
+            "Slow request %s %s: %.1fms total, %d queries, %.1fms SQL, phases %s. Slowest: %s",
+            request.method, route, total * 1000, metrics.queries, metrics.sql_time * 1000,
+            {k: round(v * 1000, 1) for k, v in metrics.phases.items()}, statements or "none",
+        )
+
+    # ---- exposition ----
+    def render(self):
+        lines = []
+        families = (
+            ("http_request_duration_seconds", "Request latency by route.", 0),
+            ("http_request_sql_seconds", "Time spent in SQL per request by route.", 1),
+            ("http_request_queries", "SQL statements per request by route.", 2),
+        )
+        with self.lock:
+            routes = sorted(self.routes.items())
+        for name, help_text, index in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route, status), histograms in routes:
+                labels = f'method="{method}",route="{route}",status="{status}"'
+                lines.extend(histograms[index].lines(name, labels))
+        for name, help_text, collect in self.gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for label, value in sorted(collect().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{name}{{stat="{label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+instrumentation = Instrumentation()
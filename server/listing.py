@@ -0,0 +1,252 @@
+import base64
+import json
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from models import Book, Review
+from instrumentation import timed
+from loading import BOOK_RELATIONS, REVIEW_RELATIONS
+from rows import book_select, book_serializer, execute, review_select, review_serializer, reviews_by_book
+
+
+class ListingError(ValueError):
+    pass
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class Listing:
+    """Query-string driven listing for a model: filters, keyset pagination and
+    sparse fieldsets. Subclasses declare what each endpoint allows.
+
+    A request with `limit` or `cursor` gets a page, {"items": [...], "next":
+    cursor}. Without either the listing is unpaginated and returns every
+    matching row as a bare list, the shape the web client reads; admission
+    control counts those requests as heavy and the response cache absorbs
+    repeats. Anything that can page should pass `limit`."""
+
+    model = None
+    fields = ()
+    relations = ()
+    sorts = {}
+
+    def __init__(self, args):
+        self.args = args
+        self.sort, self.descending = self._parse_sort(args.get("sort", "id"))
+        self.paginated = "limit" in args or "cursor" in args
+        self.limit = self._parse_limit(args.get("limit"))
+        self.cursor = self._decode_cursor(args.get("cursor"))
+        self.only, self.include = self._parse_fieldsets(args.get("fields"), args.get("include"))
+
+    # ---- parsing ----
+    def _parse_sort(self, value):
+        descending = value.startswith("-")
+        name = value.lstrip("-")
+        if name not in self.sorts:
+            raise ListingError(f"Cannot sort by '{name}'")
+        return name, descending
+
+    def _parse_limit(self, value):
+        default = current_app.config["PAGE_SIZE_DEFAULT"]
+        maximum = current_app.config["PAGE_SIZE_MAX"]
+        if value is None:
+            return default
+        try:
+            limit = int(value)
+        except ValueError:
+            raise ListingError("limit must be an integer")
+        if limit < 1:
+            raise ListingError("limit must be positive")
+        return min(limit, maximum)
+
+    def _decode_cursor(self, value):
+        if not value:
+            return None
+        try:
+            padded = value + "=" * (-len(value) % 4)
+            sort, key, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError):
+            raise ListingError("Invalid cursor")
+        if sort != self.sort_key():
+            raise ListingError("Cursor does not match sort order")
+        if not _is_int(last_id) or not self._valid_key(key):
+            raise ListingError("Invalid cursor")
+        return key, last_id
+
+    def _valid_key(self, key):
+        """Whether a cursor key has the type of the sort column."""
+        column = self.model.__table__.c[self.sorts[self.sort]]
+        if column.type.python_type is float:
+            return _is_int(key) or isinstance(key, float)
+        return _is_int(key)
+
+    def sort_key(self):
+        return ("-" if self.descending else "") + self.sort
+
+    def _encode_cursor(self, item):
+        key = getattr(item, self.sorts[self.sort])
+        raw = json.dumps([self.sort_key(), key, item.id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _parse_fieldsets(self, fields, include):
+        only = None
+        if fields is not None:
+            only = [f for f in fields.split(",") if f]
+            unknown = set(only) - set(self.fields) - set(self.relations)
+            if unknown:
+                raise ListingError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if include is not None:
+            included = [r for r in include.split(",") if r]
+            unknown = set(included) - set(self.relations)
+            if unknown:
+                raise ListingError(f"Unknown relations: {', '.join(sorted(unknown))}")
+        elif only is not None:
+            included = [r for r in self.relations if r in only]
+        else:
+            included = list(self.relations)
+        return only, tuple(included)
+
+    def int_arg(self, name):
+        value = self.args.get(name)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ListingError(f"{name} must be an integer")
+
+    # ---- querying ----
+    def filter(self, query):
+        return query
+
+    def keyset(self, query):
+        """Apply the cursor and sort order to a select."""
+        column = getattr(self.model, self.sorts[self.sort])
+        pk = self.model.id
+        if self.cursor is not None:
+            key, last_id = self.cursor
+            if column is pk:
+                query = query.filter(pk < last_id if self.descending else pk > last_id)
+            elif self.descending:
+                query = query.filter(or_(column < key, and_(column == key, pk < last_id)))
+            else:
+                query = query.filter(or_(column > key, and_(column == key, pk > last_id)))
+        order = [column.desc(), pk.desc()] if self.descending else [column, pk]
+        if column is pk:
+            order = order[:1]
+        return query.order_by(*order)
+
+    def paginate(self, query, fetch):
+        """Return (items, next_cursor). Unpaginated listings return every row."""
+        if not self.paginated:
+            return fetch(query), None
+        items = fetch(query.limit(self.limit + 1))
+        if len(items) > self.limit:
+            items = items[:self.limit]
+            return items, self._encode_cursor(items[-1])
+        return items, None
+
+    # ---- Core read path ----
+    # Read-only responses skip the ORM: select() fetches plain rows with just
+    # the needed columns and serialize_rows() turns them into the same dicts
+    # to_dict(include_relationships=True) builds from model instances.
+    def row_serializer(self):
+        raise NotImplementedError
+
+    def base_select(self):
+        raise NotImplementedError
+
+    def select(self):
+        return self.keyset(self.filter(self.base_select()))
+
+    def rows(self):
+        """Return (rows, next_cursor) as Core rows."""
+        return self.paginate(self.select(), lambda statement: execute(statement).all())
+
+    def serialize_rows(self, rows):
+        return list(map(self.row_serializer(), rows))
+
+    def response(self):
+        with timed("orm"):
+            rows, next_cursor = self.rows()
+        with timed("serialize"):
+            data = self.serialize_rows(rows)
+        if not self.paginated:
+            return data
+        return {"items": data, "next": next_cursor}
+
+
+class BookListing(Listing):
+    model = Book
+    fields = (
+        "id", "title", "author", "year_published", "description", "user_id",
+        "review_count", "average_rating", "rating_histogram",
+    )
+    relations = BOOK_RELATIONS
+    sorts = {
+        "id": "id",
+        "year_published": "year_published",
+        "rating": "rating_avg",
+        "reviews": "review_count",
+    }
+
+    def row_serializer(self):
+        only = tuple(self.only) if self.only is not None else None
+        sort_column = Book.__table__.c[self.sorts[self.sort]]
+        return book_serializer(only, self.include, (sort_column,))
+
+    def base_select(self):
+        return book_select(self.row_serializer(), self.include)
+
+    def serialize_rows(self, rows):
+        data = super().serialize_rows(rows)
+        if "reviews" in self.include:
+            reviews = reviews_by_book([row.id for row in rows])
+            for row, item in zip(rows, data):
+                item["reviews"] = reviews.get(row.id, [])
+        return data
+
+    def filter(self, query):
+        author = self.args.get("author")
+        if author:
+            query = query.filter(Book.author == author)
+        year_from = self.int_arg("year_from")
+        if year_from is not None:
+            query = query.filter(Book.year_published >= year_from)
+        year_to = self.int_arg("year_to")
+        if year_to is not None:
+            query = query.filter(Book.year_published <= year_to)
+        user_id = self.int_arg("user_id")
+        if user_id is not None:
+            query = query.filter(Book.user_id == user_id)
+        return query
+
+
+class ReviewListing(Listing):
+    model = Review
+    fields = ("id", "rating", "comment", "user_id", "book_id")
+    relations = REVIEW_RELATIONS
+    sorts = {"id": "id", "rating": "rating"}
+
+    def row_serializer(self):
+        only = tuple(self.only) if self.only is not None else None
+        sort_column = Review.__table__.c[self.sorts[self.sort]]
+        return review_serializer(only, self.include, (sort_column,))
+
+    def base_select(self):
+        return review_select(self.row_serializer(), self.include)
+
+    def filter(self, query):
+        user_id = self.int_arg("user_id")
+        if user_id is not None:
+            query = query.filter(Review.user_id == user_id)
+        book_id = self.int_arg("book_id")
+        if book_id is not None:
+            query = query.filter(Review.book_id == book_id)
+        min_rating = self.int_arg("min_rating")
+        if min_rating is not None:
+            query = query.filter(Review.rating >= min_rating)
+        return query
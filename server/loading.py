@@ -0,0 +1,44 @@
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+
+from models import Book, Review
+
+
+# Each serialized endpoint declares the relationship graph its to_dict() walks.
+# Loading the whole graph up front keeps a listing at a fixed number of
+# queries no matter how many books or reviews it returns.
+
+BOOK_RELATIONS = ("reviews", "user")
+REVIEW_RELATIONS = ("user", "book")
+
+
+def book_graph(include=BOOK_RELATIONS):
+    # Book.to_dict(include_relationships=True) -> book.user, book.reviews,
+    # and for each review, review.user and review.book (already in session).
+    configure_mappers()
+    options = []
+    if "user" in include:
+        options.append(joinedload(Book.user))
+    if "reviews" in include:
+        options.append(selectinload(Book.reviews).joinedload(Review.user))
+    return tuple(options)
+
+
+def review_graph(include=REVIEW_RELATIONS):
+    # Review.to_dict(include_relationships=True) -> review.user, review.book
+    configure_mappers()
+    options = []
+    if "user" in include:
+        options.append(joinedload(Review.user))
+    if "book" in include:
+        options.append(joinedload(Review.book))
+    return tuple(options)
+
+
+def load_books(query=None, include=BOOK_RELATIONS):
+    query = query if query is not None else Book.query
+    return query.options(*book_graph(include))
+
+
+def load_reviews(query=None, include=REVIEW_RELATIONS):
+    query = query if query is not None else Review.query
+    return query.options(*review_graph(include))
@@ -9,7 +9,8 @@ from alembic import context
 config = context.config
 
 
-fileConfig(config.config_file_name)
+# keep loggers created before an in-process upgrade (the app's slow-request log)
+fileConfig(config.config_file_name, disable_existing_loggers=False)
 logger = logging.getLogger('alembic.env')
 
 
@@ -37,6 +38,19 @@ target_db = current_app.extensions['migrate'].db
 
 
 
+# Search index objects are managed by hand-written migrations, not the models
+UNMANAGED_TABLES = ('books_fts',)
+UNMANAGED_COLUMNS = ('search_vector',)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and name.startswith(UNMANAGED_TABLES):
+        return False
+    if type_ == 'column' and name in UNMANAGED_COLUMNS:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -57,7 +71,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -87,15 +102,30 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # SQLite batch migrations rebuild tables (copy, drop, rename), and
+        # with foreign keys enforced dropping a referenced table fails or
+        # cascades; the pragma only takes effect outside a transaction
+        enforced = False
+        if connection.dialect.name == "sqlite":
+            enforced = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
+            include_object=include_object,
             **conf_args
         )
 
         with context.begin_transaction():
             context.run_migrations()
 
+        if enforced:
+            connection.commit()
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+            connection.commit()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
@@ -0,0 +1,50 @@
+"""Book review aggregates
+
+Revision ID: 3f1c9b7d2e4a
+Revises: 9d3e5b8f1a6c
+Create Date: 2026-10-18 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9b7d2e4a'
+down_revision = '9d3e5b8f1a6c'
+branch_labels = None
+depends_on = None
+
+
+COUNTERS = ['review_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+
+def upgrade():
+    with op.batch_alter_table('books') as batch_op:
+        for name in COUNTERS:
+            batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_avg', sa.Float(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_books_rating_avg_id', ['rating_avg', 'id'])
+        batch_op.create_index('ix_books_review_count_id', ['review_count', 'id'])
+
+    # Backfill from existing reviews in one set-based statement
+    op.execute("""
+        UPDATE books SET
+            review_count = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id),
+            rating_sum = (SELECT COALESCE(SUM(rating), 0) FROM reviews WHERE reviews.book_id = books.id),
+            rating_avg = (SELECT COALESCE(AVG(rating * 1.0), 0) FROM reviews WHERE reviews.book_id = books.id),
+            rating_1 = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 1),
+            rating_2 = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 2),
+            rating_3 = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 3),
+            rating_4 = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 4),
+            rating_5 = (SELECT COUNT(*) FROM reviews WHERE reviews.book_id = books.id AND rating = 5)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('books') as batch_op:
+        batch_op.drop_index('ix_books_review_count_id')
+        batch_op.drop_index('ix_books_rating_avg_id')
+        batch_op.drop_column('rating_avg')
+        for name in reversed(COUNTERS):
+            batch_op.drop_column(name)
@@ -0,0 +1,48 @@
+"""Plural table names
+
+Revision ID: 9d3e5b8f1a6c
+Revises: a822e7cec378
+Create Date: 2026-10-19 10:14:52.208317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3e5b8f1a6c'
+down_revision = 'a822e7cec378'
+branch_labels = None
+depends_on = None
+
+
+# The initial revision created user/book/review with a 128-char
+# password_hash, while the models (and create_all() at boot) have always used
+# users/books/reviews. Where only the old tables exist they are renamed and
+# widened; where create_all() also built the real ones, the unused old tables
+# are dropped if they are still empty.
+RENAMES = [('user', 'users'), ('book', 'books'), ('review', 'reviews')]
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    renamed = False
+    for old, new in reversed(RENAMES):
+        if old not in tables:
+            continue
+        if new not in tables:
+            op.rename_table(old, new)
+            renamed = True
+        elif bind.execute(sa.select(sa.func.count()).select_from(sa.table(old))).scalar() == 0:
+            op.drop_table(old)
+    if renamed:
+        with op.batch_alter_table('users', schema=None) as batch_op:
+            batch_op.alter_column('password_hash', existing_type=sa.String(length=128),
+                                  type_=sa.String(length=512), existing_nullable=False)
+
+
+def downgrade():
+    # password_hash stays at 512: current hashes no longer fit in 128
+    for old, new in RENAMES:
+        op.rename_table(new, old)
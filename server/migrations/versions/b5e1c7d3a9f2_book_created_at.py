@@ -0,0 +1,30 @@
+"""Book created_at
+
+Revision ID: b5e1c7d3a9f2
+Revises: f2b6d9a4c8e1
+Create Date: 2026-10-18 21:40:12.530144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1c7d3a9f2'
+down_revision = 'f2b6d9a4c8e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ADD COLUMN, as for updated_at, to keep the SQLite search
+    # triggers. updated_at is the closest record existing rows have.
+    op.add_column('books', sa.Column('created_at', sa.DateTime(), nullable=False,
+                                     server_default='1970-01-01 00:00:00'))
+    op.execute('UPDATE books SET created_at = updated_at')
+    if op.get_bind().dialect.name != 'sqlite':
+        op.alter_column('books', 'created_at', server_default=None)
+
+
+def downgrade():
+    op.drop_column('books', 'created_at')
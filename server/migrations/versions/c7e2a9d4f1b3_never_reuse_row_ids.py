@@ -0,0 +1,54 @@
+"""Never reuse book and review ids
+
+Revision ID: c7e2a9d4f1b3
+Revises: b5e1c7d3a9f2
+Create Date: 2026-10-18 22:05:31.774208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a9d4f1b3'
+down_revision = 'b5e1c7d3a9f2'
+branch_labels = None
+depends_on = None
+
+
+# Without AUTOINCREMENT SQLite hands out max(id) + 1, so deleting the newest
+# row frees its id for the next insert and /sync tombstones end up naming
+# live rows. PostgreSQL sequences never go back, so only SQLite changes.
+# Recreating books drops its triggers; the search index ones are restored.
+SEARCH_TRIGGERS = [
+    "CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN "
+    "INSERT INTO books_fts(rowid, title, author, description) "
+    "VALUES (new.id, new.title, new.author, new.description); END",
+    "CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, author, description) "
+    "VALUES ('delete', old.id, old.title, old.author, old.description); END",
+    "CREATE TRIGGER books_fts_au AFTER UPDATE OF title, author, description ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, author, description) "
+    "VALUES ('delete', old.id, old.title, old.author, old.description); "
+    "INSERT INTO books_fts(rowid, title, author, description) "
+    "VALUES (new.id, new.title, new.author, new.description); END",
+]
+
+
+def _recreate(autoincrement):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ('books', 'reviews'):
+        with op.batch_alter_table(table, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': autoincrement}):
+            pass
+    for statement in SEARCH_TRIGGERS:
+        op.execute(statement)
+
+
+def upgrade():
+    _recreate(True)
+
+
+def downgrade():
+    _recreate(False)
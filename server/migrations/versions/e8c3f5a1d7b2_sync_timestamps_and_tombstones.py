@@ -0,0 +1,52 @@
+"""Sync timestamps and tombstones
+
+Revision ID: e8c3f5a1d7b2
+Revises: d4a7c2e9b1f0
+Create Date: 2026-10-18 16:21:08.402617
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c3f5a1d7b2'
+down_revision = 'd4a7c2e9b1f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ADD COLUMN rather than batch mode: recreating books on SQLite
+    # would drop the full-text search triggers. SQLite only accepts a
+    # constant default here, so existing rows are stamped afterwards, with a
+    # bound DateTime rather than CURRENT_TIMESTAMP: SQLite keeps datetimes
+    # as text, and /sync pages compare them with values in SQLAlchemy's
+    # format (microseconds included).
+    now = sa.bindparam('now', datetime.now(timezone.utc).replace(tzinfo=None), type_=sa.DateTime())
+    for table in ('books', 'reviews'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                       server_default='1970-01-01 00:00:00'))
+        op.execute(sa.text(f'UPDATE {table} SET updated_at = :now').bindparams(now))
+        if op.get_bind().dialect.name != 'sqlite':
+            op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+    op.create_table('tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=20), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_deleted_at', 'tombstones', ['deleted_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tombstones_deleted_at', table_name='tombstones')
+    op.drop_table('tombstones')
+    for table in ('reviews', 'books'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
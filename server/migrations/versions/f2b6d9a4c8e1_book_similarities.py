@@ -0,0 +1,40 @@
+"""Book similarities
+
+Revision ID: f2b6d9a4c8e1
+Revises: e8c3f5a1d7b2
+Create Date: 2026-10-18 19:02:44.118350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d9a4c8e1'
+down_revision = 'e8c3f5a1d7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('book_similarities',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('similar_book_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['similar_book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('book_id', 'rank')
+    )
+    op.create_index('ix_book_similarities_similar_book_id', 'book_similarities', ['similar_book_id'], unique=False)
+    op.create_table('stale_similarities',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('stale_similarities')
+    op.drop_index('ix_book_similarities_similar_book_id', table_name='book_similarities')
+    op.drop_table('book_similarities')
@@ -1,7 +1,16 @@
+from datetime import datetime, timezone
+
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 class User(db.Model):
@@ -16,7 +25,7 @@ class User(db.Model):
     reviews = db.relationship("Review", backref="user", lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, current_app.config["PASSWORD_HASH_METHOD"])
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -43,8 +52,31 @@ class Book(db.Model):
     description = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
+    # Review aggregates, maintained in the review's transaction (aggregates.py)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_avg = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # updated_at also moves when other users review the book; created_at
+    # only records the owner's own action
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
+
     reviews = db.relationship("Review", backref="book", lazy=True)
 
+    __table_args__ = (
+        db.Index("ix_books_year_published_id", "year_published", "id"),
+        db.Index("ix_books_rating_avg_id", "rating_avg", "id"),
+        db.Index("ix_books_review_count_id", "review_count", "id"),
+        db.Index("ix_books_user_id_id", "user_id", "id"),
+        # ids are never reused, so a /sync tombstone can't name a newer row
+        {"sqlite_autoincrement": True},
+    )
+
     def to_dict(self, include_relationships=False):
         data = {
             "id": self.id,
@@ -53,6 +85,9 @@ class Book(db.Model):
             "year_published": self.year_published,
             "description": self.description,
             "user_id": self.user_id,
+            "review_count": self.review_count,
+            "average_rating": round(self.rating_avg, 2),
+            "rating_histogram": [self.rating_1, self.rating_2, self.rating_3, self.rating_4, self.rating_5],
         }
         if include_relationships:
             data["reviews"] = [review.to_dict(include_relationships=True) for review in self.reviews]
@@ -68,6 +103,14 @@ class Review(db.Model):
     comment = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     book_id = db.Column(db.Integer, db.ForeignKey("books.id"), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
+
+    __table_args__ = (
+        db.Index("ix_reviews_rating_id", "rating", "id"),
+        db.Index("ix_reviews_book_id_id", "book_id", "id"),
+        db.Index("ix_reviews_user_id_id", "user_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
 
     def to_dict(self, include_relationships=False):
         data = {
@@ -83,3 +126,33 @@ class Review(db.Model):
             if self.book:
                 data["book"] = {"id": self.book.id, "title": self.book.title}
         return data
+
+
+class Tombstone(db.Model):
+    """Records a deleted book or review so delta sync can report it."""
+    __tablename__ = "tombstones"
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(20), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+
+
+class BookSimilarity(db.Model):
+    """One of a book's top-K most similar books by co-review data (similarity.py)."""
+    __tablename__ = "book_similarities"
+
+    book_id = db.Column(db.Integer, db.ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_book_id = db.Column(
+        db.Integer, db.ForeignKey("books.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    score = db.Column(db.Float, nullable=False)
+
+
+class StaleSimilarity(db.Model):
+    """A book whose reviews changed after its neighbours were computed."""
+    __tablename__ = "stale_similarities"
+
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False)
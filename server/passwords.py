@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HashPoolFull(Exception):
+    """Raised when password hashing is saturated; the caller should retry."""
+
+    retry_after = 1
+
+
+def parse_method(method):
+    """(name, *parameters) of a werkzeug method string, with the defaults
+    werkzeug fills in, so "scrypt" and "scrypt:32768:8:1" compare equal.
+    None if the string is not one werkzeug would accept."""
+    name, *args = method.split(":")
+    try:
+        if name == "scrypt":
+            n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+            return name, n, r, p
+        if name == "pbkdf2" and len(args) <= 2:
+            hash_name = args[0] if args else "sha256"
+            iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+            return name, hash_name, iterations
+    except ValueError:
+        pass
+    return None
+
+
+class PasswordHasher:
+    """Runs password KDF work on a small bounded thread pool.
+
+    hashlib's scrypt/pbkdf2 release the GIL, so with threaded workers cheap
+    requests keep being served while hashes compute. Once the pool and its
+    queue are full, new auth requests are rejected right away instead of
+    piling up behind each other."""
+
+    def __init__(self, app=None):
+        self.executor = None
+        self.slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.parameters = parse_method(self.method)
+        if self.parameters is None:
+            raise ValueError(f"Unsupported PASSWORD_HASH_METHOD '{self.method}'")
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+        workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+        self.slots = threading.BoundedSemaphore(workers + app.config["PASSWORD_HASH_QUEUE"])
+        self.rejected = 0
+        app.extensions["password_hasher"] = self
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolFull()
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.rejected += 1
+            raise HashPoolFull()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        # werkzeug hashes look like "<method>$<salt>$<hash>"
+        return parse_method(password_hash.split("$", 1)[0]) != self.parameters
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,87 @@
+from flask import current_app
+from sqlalchemy import Float, cast, func, select, true
+
+from models import User, Book, Review
+from instrumentation import timed
+from listing import BookListing, ReviewListing
+from rows import execute
+
+
+RATINGS = (1, 2, 3, 4, 5)
+
+
+def stats_select(user_id):
+    """A user's row plus their activity figures, as one statement: each
+    side is an aggregate over that user's rows only, found through the
+    (user_id, id) indexes, so the cost follows the member's own history and
+    never loads it into Python.
+
+    Activity is taken from the user's own actions: adding a book, and
+    writing or editing a review. books.updated_at is not used, since other
+    users' reviews move it through the aggregates."""
+    books = (
+        select(
+            func.count(Book.id).label("book_count"),
+            func.max(Book.created_at).label("books_created_at"),
+        )
+        .where(Book.user_id == user_id)
+        .subquery()
+    )
+    reviews = (
+        select(
+            func.count(Review.id).label("review_count"),
+            # avg() of an integer column is a Decimal on PostgreSQL
+            cast(func.avg(Review.rating), Float).label("average_rating"),
+            func.max(Review.updated_at).label("reviews_updated_at"),
+            *[func.count(Review.id).filter(Review.rating == r).label(f"rating_{r}") for r in RATINGS],
+        )
+        .where(Review.user_id == user_id)
+        .subquery()
+    )
+    return (
+        select(User.id, User.username, User.email, books, reviews)
+        .select_from(User)
+        .join(books, true())
+        .join(reviews, true())
+        .where(User.id == user_id)
+    )
+
+
+def _timestamp(moment):
+    return moment.isoformat() + "Z" if moment is not None else None
+
+
+def serialize_stats(row):
+    activity = [moment for moment in (row.books_created_at, row.reviews_updated_at) if moment is not None]
+    return {
+        "books": row.book_count,
+        "reviews": row.review_count,
+        "average_rating_given": round(row.average_rating, 2) if row.average_rating is not None else None,
+        "rating_histogram": [row._mapping[f"rating_{r}"] for r in RATINGS],
+        "last_active": _timestamp(max(activity)) if activity else None,
+    }
+
+
+def profile(user_id, args):
+    """{user, stats, books, reviews} for a profile page, or None for an
+    unknown user. books and reviews are newest-first pages of the user's
+    rows; pass their `next` back as books_cursor / reviews_cursor."""
+    with timed("orm"):
+        row = execute(stats_select(user_id)).first()
+    if row is None:
+        return None
+    limit = args.get("limit", str(current_app.config["PROFILE_PAGE_SIZE"]))
+    books = BookListing({
+        "user_id": str(user_id), "sort": "-id", "limit": limit, "cursor": args.get("books_cursor"),
+        "include": "",
+    })
+    reviews = ReviewListing({
+        "user_id": str(user_id), "sort": "-id", "limit": limit, "cursor": args.get("reviews_cursor"),
+        "include": "book",
+    })
+    return {
+        "user": {"id": row.id, "username": row.username, "email": row.email},
+        "stats": serialize_stats(row),
+        "books": books.response(),
+        "reviews": reviews.response(),
+    }
@@ -0,0 +1,246 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from engine import configure_engine, engine_options
+
+
+STRATEGIES = ("round_robin", "least_busy")
+
+
+class Replica:
+    def __init__(self, engine, config):
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.health_interval = config["REPLICA_HEALTH_INTERVAL"]
+        self.retry_after = config["REPLICA_RETRY_SECONDS"]
+        self.in_flight = 0
+        self.selected = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        event.listen(engine, "checkout", self._checkout)
+        event.listen(engine, "checkin", self._checkin)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self.lock:
+            self.in_flight += 1
+
+    def _checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _handle_error(self, context):
+        # lost or refused connections take the replica out of rotation
+        if context.is_disconnect or context.connection is None:
+            self.mark_down()
+
+    def mark_down(self):
+        with self.lock:
+            self.failures += 1
+            self.down_until = time.monotonic() + self.retry_after
+
+    def available(self):
+        """Healthy and in rotation; pinged at most every health interval,
+        and once its retry delay is over after being marked down."""
+        now = time.monotonic()
+        if now < self.down_until:
+            return False
+        if now - self.checked_at < self.health_interval:
+            return True
+        self.checked_at = now
+        try:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+        except Exception:
+            if time.monotonic() >= self.down_until:  # handle_error may have marked it
+                self.mark_down()
+            return False
+        return True
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "healthy": time.monotonic() >= self.down_until,
+            "in_flight": self.in_flight,
+            "selected": self.selected,
+            "failures": self.failures,
+        }
+
+
+def _identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:  # no verified JWT in this request
+        return None
+
+
+class ReplicaRouter:
+    """Sends the reads of routes marked with @replicas.reads to a read
+    replica from DATABASE_REPLICA_URLS; everything else uses the primary.
+
+    Within a request, the first write (a flush or a Core INSERT, UPDATE or
+    DELETE) pins the rest of the request's statements to the primary. After
+    a user's committed write, that user's reads stay on the primary for
+    REPLICA_STICKY_SECONDS so they see their own changes despite replica lag.
+
+    Sticky state lives in the worker process that handled the write. Threads
+    of that worker share it, but other gunicorn workers and hosts do not: a
+    user's next request landing on another worker may read from a replica
+    that has not caught up yet. Run one worker per host (the Procfile does)
+    or pin users to workers at the load balancer where that matters.
+
+    Replicas that refuse connections or fail a health ping leave rotation
+    for REPLICA_RETRY_SECONDS; with none available, reads fall back to the
+    primary."""
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self.sticky = {}
+        self.last_write = 0.0
+        self.primary_reads = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.strategy = config["REPLICA_STRATEGY"]
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"REPLICA_STRATEGY must be one of {', '.join(STRATEGIES)}")
+        self.sticky_seconds = config["REPLICA_STICKY_SECONDS"]
+        self.sticky = {}
+        self.last_write = 0.0
+        self.primary_reads = 0
+        urls = [u.strip() for u in (config["DATABASE_REPLICA_URLS"] or "").split(",") if u.strip()]
+        self.replicas = []
+        for url in urls:
+            if url.startswith("postgres://"):
+                url = url.replace("postgres://", "postgresql://", 1)
+            options = dict(engine_options(config, url), pool_pre_ping=True)
+            engine = create_engine(url, **options)
+            configure_engine(engine, config)
+            self.replicas.append(Replica(engine, config))
+        self.rotation = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        app.extensions["replicas"] = self
+
+    @property
+    def engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def reads(self, view):
+        """Mark a read-only view as safe to serve from a replica."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g._replica_reads = True
+            return view(*args, **kwargs)
+        return wrapper
+
+    # ---- routing ----
+    def engine_for(self, session, clause):
+        """The replica engine for this statement, or None for the primary."""
+        if getattr(clause, "is_dml", False):
+            session.info["wrote"] = session.info["write_pending"] = True
+        if not self.replicas or not has_request_context() or not g.get("_replica_reads"):
+            return None
+        if session.info.get("wrote"):
+            return None
+        if "_replica" not in g:
+            g._replica = self.select()
+        return g._replica.engine if g._replica is not None else None
+
+    def select(self):
+        identity = _identity()
+        if identity is not None and self.sticky.get(identity, 0.0) > time.monotonic():
+            self.primary_reads += 1
+            return None
+        if self.strategy == "least_busy":
+            candidates = sorted(self.replicas, key=lambda r: r.in_flight)
+        else:
+            with self.lock:
+                start = next(self.rotation)
+            candidates = self.replicas[start:] + self.replicas[:start]
+        for replica in candidates:
+            if replica.available():
+                with replica.lock:
+                    replica.selected += 1
+                return replica
+        self.primary_reads += 1
+        return None
+
+    def served_from_replica(self):
+        return has_request_context() and g.get("_replica") is not None
+
+    def recently_written(self):
+        """Whether this process committed a write within the sticky window,
+        i.e. replicas may not have it yet."""
+        return time.monotonic() - self.last_write < self.sticky_seconds
+
+    def record_write(self):
+        now = time.monotonic()
+        self.last_write = now
+        identity = _identity() if has_request_context() else None
+        if identity is None:
+            return
+        with self.lock:
+            self.sticky[identity] = now + self.sticky_seconds
+            if len(self.sticky) > 10000:
+                self.sticky = {k: v for k, v in self.sticky.items() if v > now}
+
+    def stats(self):
+        return {
+            "strategy": self.strategy,
+            "primary_reads": self.primary_reads,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+class RoutingSession(FlaskSession):
+    """Flask-SQLAlchemy session that lets the replica router pick the bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            router = current_app.extensions.get("replicas")
+            engine = router.engine_for(self, clause) if router is not None else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# "wrote" pins the rest of the request to the primary; "write_pending"
+# starts the user's sticky window once the write commits. Set before the
+# flush (and ahead of other before_flush hooks) so the selects a flush
+# issues itself, such as loading expired attributes, go to the primary too.
+@event.listens_for(Session, "before_flush", insert=True)
+def _record_flush(session, flush_context, instances):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _record_write(session, flush_context):
+    session.info["write_pending"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_commit(session):
+    if session.info.pop("write_pending", False) and has_app_context():
+        router = current_app.extensions.get("replicas")
+        if router is not None:
+            router.record_write()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_write(session):
+    session.info.pop("write_pending", None)
+
+
+replicas = ReplicaRouter()
@@ -0,0 +1,139 @@
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from models import db, User, Book, Review
+
+
+# The read path for GET listings: Core selects of just the columns a response
+# needs, turned into to_dict()-shaped dicts by serializers compiled once per
+# field set. No ORM instances, identity map or attribute instrumentation.
+
+USERS, BOOKS, REVIEWS = User.__table__.c, Book.__table__.c, Review.__table__.c
+
+# Output key -> (expression template over the columns, columns). The templates
+# mirror the model to_dict() methods and must be kept in step with them.
+USER_DICT = ('{{"id": {0}, "username": {1}, "email": {2}}}', (USERS.id, USERS.username, USERS.email))
+
+BOOK_FIELDS = {
+    "id": ("{0}", (BOOKS.id,)),
+    "title": ("{0}", (BOOKS.title,)),
+    "author": ("{0}", (BOOKS.author,)),
+    "year_published": ("{0}", (BOOKS.year_published,)),
+    "description": ("{0}", (BOOKS.description,)),
+    "user_id": ("{0}", (BOOKS.user_id,)),
+    "review_count": ("{0}", (BOOKS.review_count,)),
+    "average_rating": ("round({0}, 2)", (BOOKS.rating_avg,)),
+    "rating_histogram": (
+        "[{0}, {1}, {2}, {3}, {4}]",
+        (BOOKS.rating_1, BOOKS.rating_2, BOOKS.rating_3, BOOKS.rating_4, BOOKS.rating_5),
+    ),
+}
+BOOK_RELATIONS = {"user": USER_DICT}
+
+REVIEW_FIELDS = {
+    "id": ("{0}", (REVIEWS.id,)),
+    "rating": ("{0}", (REVIEWS.rating,)),
+    "comment": ("{0}", (REVIEWS.comment,)),
+    "user_id": ("{0}", (REVIEWS.user_id,)),
+    "book_id": ("{0}", (REVIEWS.book_id,)),
+}
+REVIEW_RELATIONS = {
+    "user": USER_DICT,
+    "book": ('{{"id": {0}, "title": {1}}}', (BOOKS.id, BOOKS.title)),
+}
+# Review.to_dict() leaves these out when the related row is missing; they
+# are outer-joined and omitted when the joined id is NULL
+OPTIONAL_RELATIONS = frozenset(REVIEW_RELATIONS)
+
+# Same batch size selectinload uses, well under every driver's parameter limit
+IN_BATCH_SIZE = 500
+
+
+def execute(statement, **options):
+    """Run a read-path select on the session's connection (same transaction),
+    skipping the ORM's result processing."""
+    return db.session.connection().execute(statement, execution_options=options)
+
+
+class RowSerializer:
+    """Column list for a select plus a compiled `row -> dict` function.
+
+    Columns of the model's own table keep their names so rows can be read
+    like model instances (the listing cursor does); joined columns are
+    labelled `<table>_<column>`. Keys in `optional` are left out when their
+    first column is NULL."""
+
+    def __init__(self, model, keys, extra=(), optional=()):
+        self.columns = []
+        slots = {}
+
+        def slot(column):
+            if column not in slots:
+                slots[column] = len(self.columns)
+                if column.table is model.__table__:
+                    self.columns.append(column)
+                else:
+                    self.columns.append(column.label(f"{column.table.name}_{column.key}"))
+            return f"row[{slots[column]}]"
+
+        for column in extra:
+            slot(column)
+        parts = []
+        for key, (template, columns) in keys:
+            part = f"{key!r}: " + template.format(*(slot(c) for c in columns))
+            if key in optional:
+                part = f"**({{{part}}} if {slot(columns[0])} is not None else {{}})"
+            parts.append(part)
+        source = "lambda row: {" + ", ".join(parts) + "}"
+        self.function = eval(compile(source, f"<{model.__tablename__} serializer>", "eval"), {"round": round})
+
+    def __call__(self, row):
+        return self.function(row)
+
+
+@lru_cache(maxsize=64)
+def book_serializer(only, include, extra=()):
+    keys = [(k, BOOK_FIELDS[k]) for k in BOOK_FIELDS if only is None or k in only]
+    keys += [(name, BOOK_RELATIONS[name]) for name in include if name in BOOK_RELATIONS]
+    return RowSerializer(Book, keys, extra=(BOOKS.id,) + extra)
+
+
+@lru_cache(maxsize=64)
+def review_serializer(only, include, extra=()):
+    keys = [(k, REVIEW_FIELDS[k]) for k in REVIEW_FIELDS if only is None or k in only]
+    keys += [(name, REVIEW_RELATIONS[name]) for name in include]
+    return RowSerializer(Review, keys, extra=(REVIEWS.id,) + extra, optional=OPTIONAL_RELATIONS)
+
+
+# A review embedded in a book is review.to_dict(include_relationships=True)
+EMBEDDED_REVIEW = review_serializer(None, ("user", "book"), (REVIEWS.book_id,))
+
+
+def book_select(serializer, include):
+    statement = select(*serializer.columns).select_from(Book)
+    if "user" in include:
+        statement = statement.join(User, Book.user_id == User.id)
+    return statement
+
+
+def review_select(serializer, include):
+    statement = select(*serializer.columns).select_from(Review)
+    if "user" in include:
+        statement = statement.outerjoin(User, Review.user_id == User.id)
+    if "book" in include:
+        statement = statement.outerjoin(Book, Review.book_id == Book.id)
+    return statement
+
+
+def reviews_by_book(book_ids):
+    """{book_id: [review dicts]} for the given books, ordered by review id,
+    in one query per IN_BATCH_SIZE books."""
+    grouped = {}
+    base = review_select(EMBEDDED_REVIEW, ("user", "book")).order_by(Review.book_id, Review.id)
+    serialize = EMBEDDED_REVIEW.function
+    for start in range(0, len(book_ids), IN_BATCH_SIZE):
+        batch = book_ids[start:start + IN_BATCH_SIZE]
+        for row in execute(base.where(Review.book_id.in_(batch))):
+            grouped.setdefault(row.book_id, []).append(serialize(row))
+    return grouped
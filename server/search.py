@@ -0,0 +1,162 @@
+import base64
+import json
+import re
+
+from sqlalchemy import DDL, bindparam, column, event, func, literal_column, select, table, text
+
+from models import db, Book
+from listing import BookListing, ListingError
+from rows import execute
+
+
+# ---- INDEX DDL ----
+# SQLite: an external-content FTS5 table over books, kept in sync by triggers
+# so every write path (ORM, Core, raw SQL) updates the index.
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    "title, author, description, content='books', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN "
+    "INSERT INTO books_fts(rowid, title, author, description) "
+    "VALUES (new.id, new.title, new.author, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, author, description) "
+    "VALUES ('delete', old.id, old.title, old.author, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, description ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, author, description) "
+    "VALUES ('delete', old.id, old.title, old.author, old.description); "
+    "INSERT INTO books_fts(rowid, title, author, description) "
+    "VALUES (new.id, new.title, new.author, new.description); END",
+    "INSERT INTO books_fts(books_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS books_fts_au",
+    "DROP TRIGGER IF EXISTS books_fts_ad",
+    "DROP TRIGGER IF EXISTS books_fts_ai",
+    "DROP TABLE IF EXISTS books_fts",
+]
+
+# PostgreSQL: a generated, weighted tsvector column with a GIN index.
+POSTGRES_INDEX = [
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_books_search_vector ON books USING GIN (search_vector)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_books_search_vector",
+    "ALTER TABLE books DROP COLUMN IF EXISTS search_vector",
+]
+
+for statement in SQLITE_INDEX:
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in SQLITE_DROP:
+    event.listen(Book.__table__, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_INDEX:
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+# ---- QUERIES ----
+BOOKS_FTS = table("books_fts", column("rowid"))
+SEARCH_VECTOR = literal_column("search_vector")
+
+
+def _fts5_query(terms):
+    # Quote every word so user input can't inject FTS5 syntax; the last word
+    # is a prefix match so partial words still find results.
+    words = re.findall(r"\w+", terms)
+    if not words:
+        return None
+    quoted = ['"%s"' % w for w in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def matching_books(session, terms):
+    """(select of matching book ids, relevance order) for the database in
+    use, or None when the terms cannot match anything."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        query = _fts5_query(terms)
+        if query is None:
+            return None
+        statement = (
+            select(Book.id)
+            .join(BOOKS_FTS, BOOKS_FTS.c.rowid == Book.id)
+            .where(text("books_fts MATCH :query").bindparams(query=query))
+        )
+        return statement, [text("bm25(books_fts, 10.0, 5.0, 1.0)"), Book.id]
+    if dialect == "postgresql":
+        query = func.websearch_to_tsquery("english", bindparam("query", terms))
+        statement = select(Book.id).where(SEARCH_VECTOR.op("@@")(query))
+        return statement, [func.ts_rank(SEARCH_VECTOR, query).desc(), Book.id]
+    raise ListingError(f"Search is not supported on {dialect}")
+
+
+def ranked_book_ids(session, terms, limit, offset=0, refine=None, order=None):
+    """Ids of books matching `terms`, most relevant first. `refine` narrows
+    the select (listing filters) and `order` replaces relevance."""
+    matching = matching_books(session, terms)
+    if matching is None:
+        return []
+    statement, relevance = matching
+    if refine is not None:
+        statement = refine(statement)
+    statement = statement.order_by(*(order or relevance)).limit(limit).offset(offset)
+    return list(session.scalars(statement))
+
+
+class BookSearch(BookListing):
+    """Book search, most relevant first, or in `sort` order when one is
+    given; the listing filters (author, year_from, year_to, user_id) narrow
+    the matches. Ranked results aren't index-ordered, so the cursor carries
+    an offset into the ranking instead of a sort key."""
+
+    def __init__(self, args):
+        self.terms = (args.get("q") or "").strip()
+        if not self.terms:
+            raise ListingError("q is required")
+        self.by_relevance = "sort" not in args
+        super().__init__(args)
+        self.paginated = True
+
+    def order(self):
+        # cursors are only valid for the order they were issued in
+        return "relevance" if self.by_relevance else self.sort_key()
+
+    def _decode_cursor(self, value):
+        if not value:
+            return 0
+        try:
+            padded = value + "=" * (-len(value) % 4)
+            kind, order, offset = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError):
+            raise ListingError("Invalid cursor")
+        if kind != "search" or not isinstance(offset, int) or offset < 0:
+            raise ListingError("Invalid cursor")
+        if order != self.order():
+            raise ListingError("Cursor does not match sort order")
+        return offset
+
+    def _encode_offset(self, offset):
+        raw = json.dumps(["search", self.order(), offset], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _ranked(self):
+        offset = self.cursor
+        order = None
+        if not self.by_relevance:
+            column = getattr(Book, self.sorts[self.sort])
+            order = [column.desc(), Book.id.desc()] if self.descending else [column, Book.id]
+        ids = ranked_book_ids(db.session, self.terms, self.limit + 1, offset, refine=self.filter, order=order)
+        next_cursor = None
+        if len(ids) > self.limit:
+            ids = ids[:self.limit]
+            next_cursor = self._encode_offset(offset + self.limit)
+        return ids, next_cursor
+
+    def rows(self):
+        ids, next_cursor = self._ranked()
+        rows = {row.id: row for row in execute(self.base_select().where(Book.id.in_(ids)))}
+        return [rows[i] for i in ids if i in rows], next_cursor
@@ -1,12 +1,29 @@
-from app import create_app, db
+import argparse
+import random
+import time
+
+from sqlalchemy import insert
+
+from app import app, db
 from models import User, Book, Review
+from aggregates import refresh_book_aggregates
+from cli import upgrade_database
+
+WORDS = (
+    'dragon empire river shadow garden winter machine ocean crown letter silver forest '
+    'city night storm glass journey secret mirror orchard harbor lantern echo meadow'
+).split()
+
+def reset_schema():
+    db.drop_all()
+    db.session.execute(db.text('DROP TABLE IF EXISTS alembic_version'))
+    db.session.commit()
+    upgrade_database()
 
-app = create_app()
 
 def seed_data():
     with app.app_context():
-        db.drop_all()
-        db.create_all()
+        reset_schema()
 
         # Seed users
         user1 = User(username='john_doe', email='john@example.com')
@@ -44,5 +61,89 @@ def seed_data():
         db.session.commit()
         print('Database seeded!')
 
+def _words(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def check_counts(n_users, n_books, n_reviews):
+    """Raise ValueError for counts generate_synthetic can't satisfy."""
+    if min(n_users, n_books, n_reviews) < 0:
+        raise ValueError('counts must not be negative')
+    if n_books and not n_users:
+        raise ValueError('books need at least one user')
+    if n_reviews and not (n_users and n_books):
+        raise ValueError('reviews need at least one user and one book')
+
+
+def generate_synthetic(n_users, n_books, n_reviews, batch_size=5000, seed=42):
+    """Insert synthetic rows with batched executemany INSERTs.
+
+    Needs an app context and empty tables. Every user shares one password
+    hash ('password123') so generation isn't dominated by the KDF."""
+    check_counts(n_users, n_books, n_reviews)
+    rng = random.Random(seed)
+
+    def insert_batches(model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.session.execute(insert(model), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(model), batch)
+        db.session.commit()
+
+    hashed = User()
+    hashed.set_password('password123')
+    insert_batches(User, (
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': hashed.password_hash}
+        for i in range(1, n_users + 1)
+    ))
+    insert_batches(Book, (
+        {
+            'title': _words(rng, 3).title(),
+            'author': _words(rng, 2).title(),
+            'year_published': rng.randint(1800, 2024),
+            'description': _words(rng, 25),
+            'user_id': rng.randint(1, n_users),
+        }
+        for _ in range(n_books)
+    ))
+    insert_batches(Review, (
+        {
+            'rating': rng.randint(1, 5),
+            'comment': _words(rng, 12),
+            'user_id': rng.randint(1, n_users),
+            'book_id': rng.randint(1, n_books),
+        }
+        for _ in range(n_reviews)
+    ))
+    refresh_book_aggregates(db.session)
+    db.session.commit()
+
+
+def seed_synthetic(n_users, n_books, n_reviews):
+    with app.app_context():
+        reset_schema()
+        start = time.perf_counter()
+        generate_synthetic(n_users, n_books, n_reviews)
+        elapsed = time.perf_counter() - start
+        print(f'Seeded {n_users} users, {n_books} books, {n_reviews} reviews in {elapsed:.1f}s')
+
+
 if __name__ == '__main__':
-    seed_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Seed the database.')
+    parser.add_argument('--users', type=int, help='generate N synthetic users')
+    parser.add_argument('--books', type=int, default=0, help='generate N synthetic books')
+    parser.add_argument('--reviews', type=int, default=0, help='generate N synthetic reviews')
+    args = parser.parse_args()
+    if args.users or args.books or args.reviews:
+        # before reset_schema() wipes the database
+        try:
+            check_counts(args.users or 0, args.books, args.reviews)
+        except ValueError as err:
+            parser.error(str(err))
+        seed_synthetic(args.users, args.books, args.reviews)
+    else:
+        seed_data()
\ No newline at end of file
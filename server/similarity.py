@@ -0,0 +1,303 @@
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from cache import mark_changed
+from listing import ListingError
+from models import Book, BookSimilarity, Review, StaleSimilarity
+from rows import book_select, book_serializer, execute
+
+
+# Item-item collaborative filtering. Two books are similar when the same
+# users rated them the same way: the adjusted cosine of their rating columns
+# (each rating minus that user's mean), shrunk towards 0 when few users
+# rated both. Each book keeps its top-K neighbours in book_similarities,
+# rebuilt by `flask rebuild-similar` and patched by `flask update-similar`
+# for books whose reviews changed since.
+
+LOAD_BATCH_SIZE = 100000
+INSERT_BATCH_SIZE = 5000
+
+
+def _ranges(starts, lengths):
+    """Concatenated aranges: [starts[0], starts[0] + lengths[0]), ..."""
+    ends = np.cumsum(lengths)
+    return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+
+class RatingMatrix:
+    """Sparse user x book matrix of mean-centred ratings, indexed both by user
+    (CSR) and by book (CSC). A user's repeat reviews of a book count once,
+    at their average."""
+
+    def __init__(self, user_ids, book_ids, ratings):
+        self.users, user_index = np.unique(user_ids, return_inverse=True)
+        self.books, book_index = np.unique(book_ids, return_inverse=True)
+        n_users, n_books = len(self.users), len(self.books)
+
+        cells, inverse, repeats = np.unique(
+            user_index.astype(np.int64) * n_books + book_index, return_inverse=True, return_counts=True
+        )
+        values = np.bincount(inverse, weights=ratings) / repeats
+        user_index = cells // n_books
+        book_index = cells % n_books
+        per_user = np.bincount(user_index, minlength=n_users)
+        means = np.bincount(user_index, weights=values, minlength=n_users) / np.maximum(per_user, 1)
+        values = values - means[user_index]
+
+        # cells are sorted by user, then book: already CSR order
+        self.user_ptr = np.concatenate(([0], np.cumsum(per_user)))
+        self.user_books = book_index
+        self.user_values = values
+        order = np.argsort(book_index, kind="stable")
+        self.book_ptr = np.concatenate(([0], np.cumsum(np.bincount(book_index, minlength=n_books))))
+        self.book_users = user_index[order]
+        self.book_values = values[order]
+        self.norms = np.sqrt(np.bincount(book_index, weights=values ** 2, minlength=n_books))
+
+    @classmethod
+    def load(cls, session):
+        statement = select(Review.user_id, Review.book_id, Review.rating)
+        chunks = [
+            np.array(partition, dtype=np.int64).reshape(-1, 3)
+            for partition in session.execute(statement, execution_options={"yield_per": LOAD_BATCH_SIZE}).partitions()
+        ]
+        data = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int64)
+        return cls(data[:, 0], data[:, 1], data[:, 2].astype(np.float64))
+
+    def pair_counts(self):
+        """Per book, how many (book, co-rated book) products scoring it takes."""
+        per_user = np.diff(self.user_ptr)
+        sizes = np.repeat(np.arange(len(self.books)), np.diff(self.book_ptr))
+        return np.bincount(sizes, weights=per_user[self.book_users], minlength=len(self.books))
+
+    def blocks(self, rows, pair_budget):
+        """Split book indexes into runs of at most ~pair_budget products."""
+        counts = self.pair_counts()[rows]
+        start, total = 0, 0
+        for i, count in enumerate(counts):
+            if total and total + count > pair_budget:
+                yield rows[start:i]
+                start, total = i, 0
+            total += count
+        if start < len(rows):
+            yield rows[start:]
+
+    def scores(self, rows, min_common, shrinkage):
+        """Similarities of the books at `rows` to every co-rated book, as
+        sparse (row position, book index, score) arrays sorted by row."""
+        n_books = len(self.books)
+        lengths = self.book_ptr[rows + 1] - self.book_ptr[rows]
+        entries = _ranges(self.book_ptr[rows], lengths)
+        users = self.book_users[entries]
+        # expand every (row book, user) rating to all of that user's ratings
+        user_lengths = self.user_ptr[users + 1] - self.user_ptr[users]
+        others = _ranges(self.user_ptr[users], user_lengths)
+        positions = np.repeat(np.repeat(np.arange(len(rows)), lengths), user_lengths)
+        products = np.repeat(self.book_values[entries], user_lengths) * self.user_values[others]
+
+        cells, inverse = np.unique(positions * n_books + self.user_books[others], return_inverse=True)
+        dots = np.bincount(inverse, weights=products)
+        common = np.bincount(inverse)
+        positions, columns = cells // n_books, cells % n_books
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = dots / (self.norms[rows][positions] * self.norms[columns]) * (common / (common + shrinkage))
+        keep = (common >= min_common) & (columns != rows[positions]) & np.isfinite(scores) & (scores > 0)
+        return positions[keep], columns[keep], scores[keep]
+
+
+def top_k(positions, columns, scores, k):
+    """The k best (position, column, score) per position, best first."""
+    order = np.lexsort((-scores, positions))
+    positions, columns, scores = positions[order], columns[order], scores[order]
+    starts = np.searchsorted(positions, positions, side="left")
+    rank = np.arange(len(positions)) - starts
+    keep = rank < k
+    return positions[keep], columns[keep], scores[keep], rank[keep]
+
+
+def _settings():
+    config = current_app.config
+    return (
+        config["SIMILAR_TOP_K"], config["SIMILAR_MIN_COMMON"],
+        config["SIMILAR_SHRINKAGE"], config["SIMILAR_PAIR_BUDGET"],
+    )
+
+
+def _neighbour_rows(matrix, rows, k, min_common, shrinkage, pair_budget):
+    """book_similarities rows for the books at `rows`, plus the full sparse
+    scores of each block, for callers that patch the reverse direction."""
+    for block in matrix.blocks(rows, pair_budget):
+        positions, columns, scores = matrix.scores(block, min_common, shrinkage)
+        top = top_k(positions, columns, scores, k)
+        records = [
+            {"book_id": int(matrix.books[block[p]]), "rank": int(r) + 1,
+             "similar_book_id": int(matrix.books[c]), "score": float(s)}
+            for p, c, s, r in zip(*top)
+        ]
+        yield block, records, (positions, columns, scores)
+
+
+def _insert(session, records):
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        session.execute(insert(BookSimilarity), records[start:start + INSERT_BATCH_SIZE])
+
+
+def rebuild_similarities(session):
+    """Recompute every book's neighbours from all reviews. Returns the
+    number of books that have neighbours."""
+    k, min_common, shrinkage, pair_budget = _settings()
+    queued = session.scalar(select(func.max(StaleSimilarity.id)))
+    matrix = RatingMatrix.load(session)
+    session.execute(delete(BookSimilarity))
+    books = set()
+    for _, records, _ in _neighbour_rows(matrix, np.arange(len(matrix.books)), k, min_common, shrinkage, pair_budget):
+        _insert(session, records)
+        books.update(r["book_id"] for r in records)
+    if queued is not None:
+        # books queued while this ran stay queued for the next update
+        session.execute(delete(StaleSimilarity).where(StaleSimilarity.id <= queued))
+    mark_changed(session, "book_similarities")
+    session.commit()
+    return len(books)
+
+
+def update_similarities(session):
+    """Recompute the neighbours of books queued in stale_similarities and
+    patch their entries in other books' lists. Returns the number of books
+    updated.
+
+    A changed rating also shifts its user's mean and so, slightly, the
+    similarities among that user's other books; those drift until the next
+    rebuild, which should still run periodically."""
+    k, min_common, shrinkage, pair_budget = _settings()
+    queued = session.scalar(select(func.max(StaleSimilarity.id)))
+    if queued is None:
+        return 0
+    stale = set(session.scalars(select(StaleSimilarity.book_id).where(StaleSimilarity.id <= queued)))
+    matrix = RatingMatrix.load(session)
+    index = {int(book_id): i for i, book_id in enumerate(matrix.books)}
+    rows = np.array(sorted(index[b] for b in stale if b in index), dtype=np.int64)
+
+    # Fresh scores between each stale book and everything it was co-rated with
+    fresh = {}
+    session.execute(delete(BookSimilarity).where(BookSimilarity.book_id.in_(stale)))
+    for block, records, (positions, columns, scores) in _neighbour_rows(
+        matrix, rows, k, min_common, shrinkage, pair_budget
+    ):
+        _insert(session, records)
+        for p, c, s in zip(positions, columns, scores):
+            fresh.setdefault(int(matrix.books[c]), {})[int(matrix.books[block[p]])] = float(s)
+
+    # Other books' lists: drop old scores against stale books, merge the new ones
+    listing_stale = set(session.scalars(
+        select(BookSimilarity.book_id).where(BookSimilarity.similar_book_id.in_(stale))
+    ))
+    affected = sorted((set(fresh) | listing_stale) - stale)
+    for start in range(0, len(affected), INSERT_BATCH_SIZE):
+        batch = affected[start:start + INSERT_BATCH_SIZE]
+        lists = {book_id: {} for book_id in batch}
+        for row in session.execute(
+            select(BookSimilarity.book_id, BookSimilarity.similar_book_id, BookSimilarity.score)
+            .where(BookSimilarity.book_id.in_(batch))
+        ):
+            if row.similar_book_id not in stale:
+                lists[row.book_id][row.similar_book_id] = row.score
+        for book_id, neighbours in lists.items():
+            neighbours.update(fresh.get(book_id, {}))
+        session.execute(delete(BookSimilarity).where(BookSimilarity.book_id.in_(batch)))
+        records = []
+        for book_id, neighbours in lists.items():
+            best = sorted(neighbours.items(), key=lambda item: (-item[1], item[0]))[:k]
+            records.extend(
+                {"book_id": book_id, "rank": rank, "similar_book_id": other, "score": score}
+                for rank, (other, score) in enumerate(best, start=1)
+            )
+        _insert(session, records)
+
+    session.execute(delete(StaleSimilarity).where(StaleSimilarity.id <= queued))
+    mark_changed(session, "book_similarities")
+    session.commit()
+    return len(stale)
+
+
+# ---- QUEUE ----
+def queue_stale_books(session, book_ids):
+    records = [{"book_id": book_id} for book_id in sorted(set(book_ids)) if book_id is not None]
+    if records:
+        session.execute(insert(StaleSimilarity), records)
+
+
+def _old_value(obj, key):
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+
+@event.listens_for(Session, "after_flush")
+def _queue_changed_reviews(session, flush_context):
+    books = set()
+    for obj in session.new:
+        if isinstance(obj, Review):
+            books.add(obj.book_id)
+    for obj in session.deleted:
+        if isinstance(obj, Review):
+            books.add(_old_value(obj, "book_id"))
+    for obj in session.dirty:
+        if isinstance(obj, Review) and obj not in session.deleted:
+            old_book, old_rating = _old_value(obj, "book_id"), _old_value(obj, "rating")
+            if (old_book, old_rating) != (obj.book_id, obj.rating):
+                books.update((old_book, obj.book_id))
+    queue_stale_books(session, books)
+
+
+# ---- LOOKUPS ----
+def parse_limit(value, maximum):
+    if value is None:
+        return min(10, maximum)
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ListingError("limit must be an integer")
+    if limit < 1:
+        raise ListingError("limit must be positive")
+    return min(limit, maximum)
+
+
+def similar_to(book_id, limit):
+    """[{"book": ..., "score": ...}] for a book's nearest neighbours."""
+    serializer = book_serializer(None, ())
+    statement = (
+        book_select(serializer, ())
+        .add_columns(BookSimilarity.score)
+        .join(BookSimilarity, BookSimilarity.similar_book_id == Book.id)
+        .where(BookSimilarity.book_id == book_id)
+        .order_by(BookSimilarity.rank)
+        .limit(limit)
+    )
+    return [{"book": serializer(row), "score": round(row[-1], 4)} for row in execute(statement)]
+
+
+def recommend_for(user_id, limit):
+    """Books the user hasn't reviewed, scored by their neighbours among the
+    books the user has: liked books (above 3) pull neighbours up, disliked
+    ones push them down."""
+    reviewed = select(Review.book_id).where(Review.user_id == user_id)
+    affinity = func.sum(BookSimilarity.score * (Review.rating - 3)).label("affinity")
+    candidates = (
+        select(BookSimilarity.similar_book_id.label("book_id"), affinity)
+        .join(Review, Review.book_id == BookSimilarity.book_id)
+        .where(Review.user_id == user_id, BookSimilarity.similar_book_id.not_in(reviewed))
+        .group_by(BookSimilarity.similar_book_id)
+        .subquery()
+    )
+    serializer = book_serializer(None, ())
+    statement = (
+        book_select(serializer, ())
+        .add_columns(candidates.c.affinity)
+        .join(candidates, candidates.c.book_id == Book.id)
+        .where(candidates.c.affinity > 0)
+        .order_by(candidates.c.affinity.desc(), Book.id)
+        .limit(limit)
+    )
+    return [{"book": serializer(row), "score": round(row[-1], 4)} for row in execute(statement)]
@@ -0,0 +1,175 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, event, insert, or_, select
+from sqlalchemy.orm import Session
+
+from models import db, utcnow, Book, Review, Tombstone
+from listing import ListingError, BookListing, ReviewListing
+from rows import execute
+
+
+SYNCED = {"books": Book, "reviews": Review}
+# What a /sync cursor holds a (timestamp, id) position for
+STREAMS = ("books", "reviews", "deleted_books", "deleted_reviews")
+
+
+# ORM deletes of books and reviews leave a tombstone in the same transaction
+@event.listens_for(Session, "before_flush")
+def _record_tombstones(session, flush_context, instances):
+    for obj in list(session.deleted):
+        if isinstance(obj, (Book, Review)):
+            session.add(Tombstone(table_name=obj.__tablename__, row_id=obj.id))
+
+
+def record_tombstones(session, table_name, row_ids):
+    """Tombstones for rows removed with set-based DELETE statements."""
+    now = utcnow()
+    rows = [{"table_name": table_name, "row_id": row_id, "deleted_at": now} for row_id in row_ids]
+    if rows:
+        session.execute(insert(Tombstone), rows)
+
+
+# ---- TOKENS ----
+def encode_token(moment):
+    raw = moment.strftime("%Y-%m-%dT%H:%M:%S.%f").encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return datetime.strptime(base64.urlsafe_b64decode(padded).decode(), "%Y-%m-%dT%H:%M:%S.%f")
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ListingError("Invalid sync token")
+
+
+# ---- PAGES ----
+def encode_cursor(since, started, positions):
+    state = [
+        encode_token(since) if since is not None else None,
+        encode_token(started),
+        {name: [encode_token(moment), last_id] for name, (moment, last_id) in positions.items()},
+    ]
+    raw = json.dumps(state, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(since, started, positions) of a sync continued from an earlier page."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        since, started, positions = json.loads(base64.urlsafe_b64decode(padded))
+        decoded = {}
+        for name, (moment, last_id) in positions.items():
+            if name not in STREAMS or not isinstance(last_id, int) or isinstance(last_id, bool):
+                raise ValueError(name)
+            decoded[name] = (decode_token(moment), last_id)
+        return decode_token(since) if since is not None else None, decode_token(started), decoded
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError, ListingError):
+        raise ListingError("Invalid sync cursor")
+
+
+def _parse_limit(value, maximum):
+    if value is None:
+        return maximum
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ListingError("limit must be an integer")
+    if limit < 1:
+        raise ListingError("limit must be positive")
+    return min(limit, maximum)
+
+
+class Pager:
+    """Keyset pages in (timestamp, id) order over each stream of a sync,
+    remembering where every stream stopped."""
+
+    def __init__(self, positions, limit):
+        self.positions = positions
+        self.limit = limit
+        self.more = False
+
+    def read(self, name, statement, column, pk):
+        position = self.positions.get(name)
+        if position is not None:
+            moment, last_id = position
+            statement = statement.where(or_(column > moment, and_(column == moment, pk > last_id)))
+        statement = statement.add_columns(column.label("synced_at"), pk.label("synced_id"))
+        rows = execute(statement.order_by(column, pk).limit(self.limit + 1)).all()
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            self.more = True
+        if rows:
+            self.positions[name] = (rows[-1].synced_at, rows[-1].synced_id)
+        return rows
+
+
+# ---- SYNC ----
+def _changed(pager, name, listing, column, since):
+    statement = listing.base_select()
+    if since is not None:
+        statement = statement.where(column > since)
+    return listing.serialize_rows(pager.read(name, statement, column, listing.model.id))
+
+
+def _deleted(pager, name, model, since):
+    # ids are not reused, but rows recreated under a tombstoned id before
+    # that was true are live and come back as upserts
+    live = select(model.id).where(model.id == Tombstone.row_id).exists()
+    statement = select(Tombstone.row_id).where(
+        Tombstone.table_name == name, Tombstone.deleted_at > since, ~live
+    )
+    return [row.row_id for row in pager.read("deleted_" + name, statement, Tombstone.deleted_at, Tombstone.id)]
+
+
+def sync(args):
+    """Books, reviews and deletions changed since the `since` token.
+
+    Without a token, or with one older than the tombstone retention, the
+    response is a full snapshot (full=true) the client should replace its
+    copy with. Each kind of row comes in pages of at most `limit`
+    (SYNC_PAGE_SIZE by default and at most): while `cursor` is set the
+    client fetches /sync?cursor=... for the rest, and the last page carries
+    the `next` token for the following poll. That token trails the first
+    page's read by SYNC_SAFETY_WINDOW_SECONDS, so rows from transactions
+    that commit late, or change while the client pages, are sent again
+    rather than missed; clients apply deletions, then the changed rows as
+    idempotent upserts."""
+    config = current_app.config
+    limit = _parse_limit(args.get("limit"), config["SYNC_PAGE_SIZE"])
+    if args.get("cursor"):
+        since, started, positions = decode_cursor(args["cursor"])
+    else:
+        started = utcnow()
+        since = decode_token(args["since"]) if args.get("since") else None
+        retention = timedelta(days=config["SYNC_TOMBSTONE_RETENTION_DAYS"])
+        if since is not None and since < started - retention:
+            since = None
+        positions = {}
+
+    pager = Pager(positions, limit)
+    books = _changed(pager, "books", BookListing({"include": "user"}), Book.updated_at, since)
+    reviews = _changed(pager, "reviews", ReviewListing({"include": "user,book"}), Review.updated_at, since)
+    deleted = {name: [] for name in SYNCED}
+    if since is not None:
+        for name, model in SYNCED.items():
+            deleted[name] = _deleted(pager, name, model, since)
+
+    next_since = started - timedelta(seconds=config["SYNC_SAFETY_WINDOW_SECONDS"])
+    return {
+        "full": since is None,
+        "books": books,
+        "reviews": reviews,
+        "deleted": deleted,
+        "cursor": encode_cursor(since, started, pager.positions) if pager.more else None,
+        "next": None if pager.more else encode_token(next_since),
+    }
+
+
+def prune_tombstones(session, retention_days):
+    cutoff = utcnow() - timedelta(days=retention_days)
+    return session.query(Tombstone).filter(Tombstone.deleted_at < cutoff).delete(synchronize_session=False)
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER)
+
+# app.py builds a module-level app at import; keep it off the dev database.
+# Tests get their own apps and databases from make_app.
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "import.db")
+os.environ.setdefault("ADMISSION_ENABLED", "0")
+os.environ.setdefault("INSTRUMENTATION_ENABLED", "0")
+
+from app import create_app  # noqa: E402
+from cli import upgrade_database  # noqa: E402
+from config import Config  # noqa: E402
+
+from helpers import auth_headers, seed_rows  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """make_app(database="test.db", **config) builds an app on a fresh,
+    migrated SQLite file; config overrides Config before extensions read it."""
+    def make(database="test.db", **config):
+        monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", "sqlite:///" + str(tmp_path / database))
+        for key, value in config.items():
+            monkeypatch.setattr(Config, key, value, raising=False)
+        application = create_app()
+        application.config["TESTING"] = True
+        with application.app_context():
+            upgrade_database()
+        return application
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    return lambda users, books=0, reviews=0: seed_rows(app, users, books, reviews)
+
+
+@pytest.fixture
+def auth(app):
+    return lambda user_id: auth_headers(app, user_id)
@@ -0,0 +1,33 @@
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from models import db
+from seed import generate_synthetic
+
+
+def seed_rows(app, users, books=0, reviews=0):
+    """Insert synthetic rows (ids from 1) into the app's empty database."""
+    with app.app_context():
+        generate_synthetic(users, books, reviews)
+
+
+def auth_headers(app, user_id):
+    with app.app_context():
+        return {"Authorization": "Bearer " + create_access_token(identity=user_id)}
+
+
+def count_statements(app, fn):
+    """Run fn() and return (its result, the number of statements it sent)."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return result, len(statements)
@@ -0,0 +1,92 @@
+import os
+import re
+
+from admission import admission
+from config import Config
+from helpers import auth_headers, seed_rows
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _app(make_app, **config):
+    settings = dict(ADMISSION_ENABLED=True, ADMISSION_URL="memory://")
+    settings.update(config)
+    return make_app(**settings)
+
+
+def _login(client, address):
+    return client.post("/login", json={"username": "nobody", "password": "x"},
+                       headers={"X-Forwarded-For": address})
+
+
+def test_auth_bucket_is_per_forwarded_client(make_app):
+    app = _app(make_app, RATE_LIMIT_AUTH_PER_SECOND=0.001, RATE_LIMIT_AUTH_BURST=3)
+    client = app.test_client()
+    assert [_login(client, "203.0.113.1").status_code for _ in range(4)] == [401, 401, 401, 429]
+    limited = _login(client, "203.0.113.1")
+    assert int(limited.headers["Retry-After"]) >= 1
+    # another client behind the same proxy has its own bucket
+    assert _login(client, "203.0.113.2").status_code == 401
+
+
+def test_forwarded_header_is_ignored_without_a_trusted_proxy(make_app):
+    app = _app(make_app, PROXY_FIX_X_FOR=0, RATE_LIMIT_AUTH_PER_SECOND=0.001, RATE_LIMIT_AUTH_BURST=1)
+    client = app.test_client()
+    assert _login(client, "203.0.113.1").status_code == 401
+    assert _login(client, "203.0.113.2").status_code == 429
+
+
+def test_heavy_cap_answers_503_but_cache_hits_pass(make_app):
+    app = _app(make_app, ADMISSION_MAX_HEAVY=1)
+    seed_rows(app, 2, 5, 10)
+    client = app.test_client()
+    headers = auth_headers(app, 1)
+    assert client.get("/books", headers=headers).status_code == 200
+
+    slot = admission.backend.acquire("heavy", 1, 60)  # a long request in progress
+    try:
+        assert client.get("/books", headers=headers).status_code == 200
+        busy = client.get("/reviews", headers=headers)
+        assert busy.status_code == 503
+        assert busy.headers["Retry-After"] == "1"
+        # a page is in the read class, which has no cap by default
+        assert client.get("/reviews?limit=5", headers=headers).status_code == 200
+    finally:
+        admission.backend.release("heavy", slot)
+    assert client.get("/reviews", headers=headers).status_code == 200
+
+
+def test_slots_are_released(make_app):
+    app = _app(make_app, ADMISSION_MAX_HEAVY=1)
+    seed_rows(app, 2, 5, 10)
+    client = app.test_client()
+    headers = auth_headers(app, 1)
+    for fmt in ("json", "ndjson"):
+        assert client.get(f"/export/books?format={fmt}", headers=headers).status_code == 200
+    assert admission.backend.in_flight("heavy") == 0
+
+
+def test_exempt_routes_are_never_limited(make_app):
+    app = _app(make_app, RATE_LIMIT_IP_PER_SECOND=0.001, RATE_LIMIT_IP_BURST=1)
+    client = app.test_client()
+    assert all(client.get("/health").status_code == 200 for _ in range(3))
+
+
+def test_ranked_and_similar_books_are_heavy(make_app):
+    app = _app(make_app, ADMISSION_MAX_HEAVY=1)
+    seed_rows(app, 2, 5, 10)
+    client = app.test_client()
+    headers = auth_headers(app, 1)
+    slot = admission.backend.acquire("heavy", 1, 60)
+    try:
+        assert client.get("/books/top", headers=headers).status_code == 503
+        assert client.get("/books/1/similar", headers=headers).status_code == 503
+    finally:
+        admission.backend.release("heavy", slot)
+
+
+def test_default_caps_leave_request_threads_free():
+    with open(os.path.join(SERVER, "Procfile")) as procfile:
+        threads = int(re.search(r"--threads (\d+)", procfile.read()).group(1))
+    assert 0 < Config.ADMISSION_MAX_AUTH < threads
+    assert 0 < Config.ADMISSION_MAX_HEAVY < threads
@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import select
+
+from models import db, Book, Review
+
+
+def _aggregates(app, book_id):
+    with app.app_context():
+        book = db.session.get(Book, book_id)
+        histogram = [book.rating_1, book.rating_2, book.rating_3, book.rating_4, book.rating_5]
+        return book.review_count, book.rating_sum, round(book.rating_avg, 4), histogram
+
+
+def _recomputed(app, book_id):
+    with app.app_context():
+        ratings = list(db.session.scalars(select(Review.rating).where(Review.book_id == book_id)))
+    average = round(sum(ratings) / len(ratings), 4) if ratings else 0.0
+    return len(ratings), sum(ratings), average, [ratings.count(r) for r in range(1, 6)]
+
+
+def _consistent(app, *book_ids):
+    for book_id in book_ids:
+        assert _aggregates(app, book_id) == _recomputed(app, book_id)
+
+
+def test_review_writes_keep_book_aggregates(app, client, seed, auth):
+    seed(2, 3, 20)
+    headers = auth(1)
+    response = client.post("/reviews", json={"rating": "5", "comment": "c", "book_id": 1}, headers=headers)
+    assert response.status_code == 201
+    review_id = response.get_json()["id"]
+    _consistent(app, 1)
+
+    assert client.patch(f"/reviews/{review_id}", json={"rating": 2}, headers=headers).status_code == 200
+    _consistent(app, 1)
+    assert client.patch(f"/reviews/{review_id}", json={"comment": "only text"}, headers=headers).status_code == 200
+    _consistent(app, 1)
+
+    assert client.delete(f"/reviews/{review_id}", headers=headers).status_code == 200
+    _consistent(app, 1)
+
+
+def test_moving_a_review_updates_both_books(app, seed):
+    seed(2, 3, 20)
+    with app.app_context():
+        review = db.session.scalar(select(Review).where(Review.book_id == 1).limit(1))
+        review.book_id, review.rating = 2, 5 if review.rating != 5 else 1
+        db.session.commit()
+    _consistent(app, 1, 2)
+
+
+@pytest.mark.parametrize("rating", [9, 0, "five", None])
+def test_invalid_ratings_are_rejected(app, client, seed, auth, rating):
+    seed(1, 1, 3)
+    headers = auth(1)
+    before = _aggregates(app, 1)
+    created = client.post("/reviews", json={"rating": rating, "comment": "c", "book_id": 1}, headers=headers)
+    assert created.status_code == 400
+    with app.app_context():
+        own = db.session.scalar(select(Review.id).where(Review.user_id == 1).limit(1))
+    patched = client.patch(f"/reviews/{own}", json={"rating": rating}, headers=headers)
+    assert patched.status_code == 400
+    assert _aggregates(app, 1) == before
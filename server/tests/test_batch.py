@@ -0,0 +1,130 @@
+import pytest
+from sqlalchemy import func, select
+
+from helpers import auth_headers, seed_rows
+from models import db, Book, BookSimilarity, Review, Tombstone
+from similarity import rebuild_similarities
+
+
+def _batch(client, headers, *operations):
+    response = client.post("/batch", json={"operations": list(operations)}, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def _owned(app, model, user_id, other=False):
+    with app.app_context():
+        owner = model.user_id != user_id if other else model.user_id == user_id
+        return db.session.scalar(select(model).where(owner).order_by(model.id).limit(1))
+
+
+def _snapshot(app):
+    with app.app_context():
+        books = db.session.execute(select(Book.id, Book.title, Book.review_count, Book.rating_sum)
+                                   .order_by(Book.id)).all()
+        reviews = db.session.execute(select(Review.id, Review.rating).order_by(Review.id)).all()
+        return books, reviews
+
+
+def _tombstones(app, table):
+    with app.app_context():
+        return set(db.session.scalars(select(Tombstone.row_id).where(Tombstone.table_name == table)))
+
+
+def test_operations_apply_together_and_keep_aggregates(app, client, seed, auth):
+    seed(2, 10, 60)
+    book, review = _owned(app, Book, 1), _owned(app, Review, 1)
+    status, body = _batch(
+        client, auth(1),
+        {"op": "create", "type": "book",
+         "data": {"title": "New", "author": "Me", "year_published": 2020, "description": "d"}},
+        {"op": "create", "type": "review", "data": {"rating": 5, "comment": "c", "book_id": book.id}},
+        {"op": "patch", "type": "book", "id": book.id, "data": {"title": "Renamed"}},
+        {"op": "patch", "type": "review", "id": review.id, "data": {"rating": 1}},
+    )
+    assert status == 200 and body["applied"]
+    results = body["results"]
+    assert [r["status"] for r in results] == [201, 201, 200, 200]
+    with app.app_context():
+        assert db.session.get(Book, results[0]["id"]).title == "New"
+        assert db.session.get(Review, results[1]["id"]).book_id == book.id
+        assert db.session.get(Book, book.id).title == "Renamed"
+        assert db.session.get(Review, review.id).rating == 1
+        counts = dict(db.session.execute(
+            select(Review.book_id, func.count()).group_by(Review.book_id)).all())
+        sums = dict(db.session.execute(
+            select(Review.book_id, func.sum(Review.rating)).group_by(Review.book_id)).all())
+        for row in db.session.scalars(select(Book)):
+            assert (row.review_count, row.rating_sum) == (counts.get(row.id, 0), sums.get(row.id, 0))
+
+
+def test_any_error_rejects_the_whole_batch(app, client, seed, auth):
+    seed(2, 10, 60)
+    mine, theirs = _owned(app, Book, 1), _owned(app, Book, 1, other=True)
+    before = _snapshot(app)
+    status, body = _batch(
+        client, auth(1),
+        {"op": "patch", "type": "book", "id": mine.id, "data": {"title": "Renamed"}},
+        {"op": "patch", "type": "book", "id": theirs.id, "data": {"title": "Mine now"}},
+        {"op": "delete", "type": "review", "id": 10 ** 6},
+        {"op": "patch", "type": "review", "id": 1, "data": {"user_id": 1}},
+        {"op": "upsert", "type": "book"},
+        {"op": "patch", "type": "book", "id": mine.id, "data": {"title": "Again"}},
+    )
+    assert status == 400 and not body["applied"]
+    assert [(e["index"], e["status"]) for e in body["errors"]] == [(1, 403), (2, 404), (3, 400), (4, 400), (5, 400)]
+    assert _snapshot(app) == before
+
+
+def test_deleting_a_book_removes_its_reviews_and_similarities(app, client, seed, auth):
+    seed(2, 10, 80)
+    with app.app_context():
+        rebuild_similarities(db.session)
+        book = db.session.scalar(
+            select(Book).where(Book.user_id == 1, Book.review_count > 0).order_by(Book.id).limit(1))
+        review_ids = set(db.session.scalars(select(Review.id).where(Review.book_id == book.id)))
+    status, body = _batch(client, auth(1), {"op": "delete", "type": "book", "id": book.id})
+    assert status == 200 and body["applied"]
+    with app.app_context():
+        assert db.session.get(Book, book.id) is None
+        assert not db.session.scalars(select(Review.id).where(Review.id.in_(review_ids))).all()
+        assert not db.session.scalars(select(BookSimilarity.rank).where(
+            (BookSimilarity.book_id == book.id) | (BookSimilarity.similar_book_id == book.id))).all()
+    assert book.id in _tombstones(app, "books")
+    assert review_ids <= _tombstones(app, "reviews")
+
+
+def test_reviews_cannot_target_a_book_the_batch_deletes(app, client, seed, auth):
+    seed(2, 10, 60)
+    book = _owned(app, Book, 1)
+    status, body = _batch(
+        client, auth(1),
+        {"op": "delete", "type": "book", "id": book.id},
+        {"op": "create", "type": "review", "data": {"rating": 3, "comment": "c", "book_id": book.id}},
+        {"op": "delete", "type": "book", "id": book.id},
+    )
+    assert status == 400
+    assert [(e["index"], e["status"]) for e in body["errors"]] == [(1, 400), (2, 400)]
+
+
+def test_batch_writes_retire_cached_listings(app, client, seed, auth):
+    seed(2, 5)
+    headers = auth(1)
+    book = _owned(app, Book, 1)
+    assert client.get("/books", headers=headers).status_code == 200
+    _batch(client, headers, {"op": "patch", "type": "book", "id": book.id, "data": {"title": "Fresh"}})
+    titles = {b["id"]: b["title"] for b in client.get("/books", headers=headers).get_json()}
+    assert titles[book.id] == "Fresh"
+
+
+@pytest.mark.parametrize("payload, error", [
+    ([], "Body must be a JSON object with an operations list"),
+    ({"operations": {}}, "operations must be a list"),
+    ({"operations": []}, "operations must not be empty"),
+    ({"operations": [{"op": "delete", "type": "book", "id": 1}] * 3}, "At most 2 operations per batch"),
+])
+def test_malformed_batches(make_app, payload, error):
+    app = make_app(BATCH_MAX_OPERATIONS=2)
+    seed_rows(app, 1)
+    response = app.test_client().post("/batch", json=payload, headers=auth_headers(app, 1))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+from helpers import auth_headers, seed_rows
+from models import db, Book
+from seed import generate_synthetic
+
+
+def _books(app):
+    with app.app_context():
+        return db.session.scalar(select(func.count()).select_from(Book))
+
+
+def _line(i):
+    return json.dumps({"title": f"Book {i}", "author": "Author", "year_published": 2000,
+                       "description": "Imported."}) + "\n"
+
+
+def test_bulk_import_reports_rows_and_errors(client, seed, auth):
+    seed(1)
+    body = _line(1) + "not json\n" + json.dumps({"title": "No author"}) + "\n" + _line(2)
+    response = client.post("/books/bulk", data=body, headers=auth(1), content_type="application/x-ndjson")
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["inserted"] == 2
+    assert result["failed"] == 2
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+
+
+def test_decode_error_reports_rows_already_committed(make_app):
+    app = make_app(BULK_BATCH_SIZE=10)
+    seed_rows(app, 1)
+    # well past the decoder's first read, so earlier batches commit first
+    body = "".join(_line(i) for i in range(500)).encode() + b"\xff\xfe\n"
+    response = app.test_client().post(
+        "/books/bulk", data=body, headers=auth_headers(app, 1), content_type="application/x-ndjson"
+    )
+    assert response.status_code == 400
+    result = response.get_json()
+    assert result["error"] == "Body must be UTF-8 encoded"
+    assert 0 < result["inserted"] < 500
+    assert result["inserted"] == _books(app)
+
+
+@pytest.mark.parametrize("counts", [(2, 0, 5), (0, 3, 0), (0, 0, 1), (-1, 0, 0)])
+def test_synthetic_seed_rejects_impossible_counts(app, counts):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            generate_synthetic(*counts)
+    assert _books(app) == 0
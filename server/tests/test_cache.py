@@ -0,0 +1,43 @@
+import time
+
+from models import db, Book
+from helpers import auth_headers, seed_rows
+
+NEW_BOOK = {"title": "New", "author": "Someone", "year_published": 2000, "description": "d"}
+
+
+def test_escaped_arguments_do_not_share_an_entry(client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    assert client.get("/books?author=Nobody%26limit%3D1", headers=headers).get_json() == []
+    assert client.get("/books?author=Nobody&limit=1", headers=headers).get_json() == {"items": [], "next": None}
+
+
+def test_a_write_retires_cached_listings(client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    first = client.get("/books", headers=headers)
+    assert client.get("/books", headers=dict(headers, **{"If-None-Match": first.headers["ETag"]})).status_code == 304
+
+    client.post("/books", json=NEW_BOOK, headers=headers)
+    assert len(client.get("/books", headers=headers).get_json()) == len(first.get_json()) + 1
+
+
+def test_entries_expire_after_the_ttl(make_app):
+    app = make_app(RESPONSE_CACHE_TTL=0.2)
+    client = app.test_client()
+    seed_rows(app, 2, 5, 10)
+    headers = auth_headers(app, 1)
+
+    def first_title():
+        return client.get("/books?limit=1", headers=headers).get_json()["items"][0]["title"]
+
+    original = first_title()
+    # a write the cache does not hear about, as from another process
+    with app.app_context():
+        db.session.execute(db.update(Book).where(Book.id == 1).values(title="Changed elsewhere"))
+        db.session.info.pop("changed_tables", None)
+        db.session.commit()
+    assert first_title() == original
+    time.sleep(0.25)
+    assert first_title() == "Changed elsewhere"
@@ -0,0 +1,65 @@
+import gzip
+
+import pytest
+
+from compression import brotli, zstandard
+from helpers import auth_headers, seed_rows
+
+DECODERS = {"gzip": gzip.decompress}
+if brotli is not None:
+    DECODERS["br"] = brotli.decompress
+if zstandard is not None:
+    DECODERS["zstd"] = lambda data: zstandard.ZstdDecompressor().decompress(data)
+
+
+@pytest.fixture
+def listing(app, client, seed, auth):
+    seed(2, 20, 40)
+    headers = auth(1)
+
+    def get(**extra):
+        return client.get("/books", headers=dict(headers, **extra))
+    return get
+
+
+@pytest.mark.parametrize("encoding", sorted(DECODERS))
+def test_each_encoding_decodes_to_the_identity_body(listing, encoding):
+    identity = listing()
+    assert "Content-Encoding" not in identity.headers
+    assert "Accept-Encoding" in identity.headers["Vary"]
+    encoded = listing(**{"Accept-Encoding": encoding})
+    assert encoded.headers["Content-Encoding"] == encoding
+    assert "Accept-Encoding" in encoded.headers["Vary"]
+    assert DECODERS[encoding](encoded.get_data()) == identity.get_data()
+
+
+def test_client_quality_then_server_preference_decide(listing):
+    assert listing(**{"Accept-Encoding": "gzip;q=1, br;q=0.5, zstd;q=0.1"}).headers["Content-Encoding"] == "gzip"
+    preferred = "zstd" if zstandard is not None else "br" if brotli is not None else "gzip"
+    assert listing(**{"Accept-Encoding": "gzip, br, zstd"}).headers["Content-Encoding"] == preferred
+    assert "Content-Encoding" not in listing(**{"Accept-Encoding": "compress"}).headers
+
+
+def test_small_bodies_are_sent_as_is(make_app):
+    app = make_app(COMPRESS_MIN_SIZE=10 ** 6)
+    seed_rows(app, 2, 20, 40)
+    response = app.test_client().get("/books", headers=dict(auth_headers(app, 1), **{"Accept-Encoding": "gzip"}))
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_each_encoding_has_its_own_strong_etag(listing):
+    identity = listing().headers["ETag"]
+    gzipped = listing(**{"Accept-Encoding": "gzip"}).headers["ETag"]
+    assert not identity.startswith("W/") and not gzipped.startswith("W/")
+    assert gzipped == identity[:-1] + '-gzip"'
+
+
+def test_if_none_match_compares_the_negotiated_representation(listing):
+    tag = listing(**{"Accept-Encoding": "gzip"}).headers["ETag"]
+    not_modified = listing(**{"Accept-Encoding": "gzip", "If-None-Match": tag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == tag
+    assert "Accept-Encoding" in not_modified.headers["Vary"]
+    # the gzip validator does not stand for the identity body
+    assert listing(**{"If-None-Match": tag}).status_code == 200
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine, delete, exc, func, or_, select
+
+from engine import InstrumentedQueuePool
+from models import db, Book, BookSimilarity, Review
+from similarity import rebuild_similarities
+
+
+def test_sqlite_connections_enforce_foreign_keys(app, seed):
+    seed(40, 20, 600)
+    with app.app_context():
+        assert db.session.connection().exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+        rebuild_similarities(db.session)
+        db.session.commit()
+        book_id = db.session.scalar(select(BookSimilarity.similar_book_id))
+
+        def similarity_rows():
+            return db.session.scalar(select(func.count()).select_from(BookSimilarity).where(or_(
+                BookSimilarity.book_id == book_id, BookSimilarity.similar_book_id == book_id
+            )))
+
+        assert similarity_rows() > 0
+        with pytest.raises(exc.IntegrityError):  # its reviews still point at it
+            db.session.execute(delete(Book).where(Book.id == book_id))
+        db.session.rollback()
+
+        db.session.execute(delete(Review).where(Review.book_id == book_id))
+        db.session.execute(delete(Book).where(Book.id == book_id))
+        assert similarity_rows() == 0  # ON DELETE CASCADE
+
+
+def test_pool_records_checkouts_waits_and_timeouts(tmp_path):
+    engine = create_engine(
+        "sqlite:///" + str(tmp_path / "pool.db"),
+        poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05,
+    )
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    stats = engine.pool.snapshot()
+    assert (stats["checkouts"], stats["timeouts"]) == (1, 1)
+    assert (stats["checked_out"], stats["peak_checked_out"], stats["saturation"]) == (1, 1, 1.0)
+    assert stats["wait_max_ms"] >= 50
+
+    held.close()
+    engine.connect().close()
+    stats = engine.pool.snapshot()
+    assert (stats["checkouts"], stats["checked_out"], stats["peak_checked_out"]) == (2, 0, 1)
+    engine.dispose()
+
+
+def test_pool_stats_are_on_metrics_and_health(make_app):
+    app = make_app(INSTRUMENTATION_ENABLED=True, DB_POOL_SIZE=3, DB_MAX_OVERFLOW=2)
+    client = app.test_client()
+    pool = client.get("/health").get_json()["pool"]
+    assert (pool["size"], pool["max_overflow"], pool["checked_out"]) == (3, 2, 0)
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE db_pool gauge" in body
+    for stat in ("size", "checked_out", "peak_checked_out", "saturation", "checkouts", "timeouts", "wait_max_ms"):
+        assert f'db_pool{{stat="{stat}"}} ' in body
+    assert 'db_pool{stat="size"} 3' in body
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from encoding import orjson
+
+
+def _export(client, headers, path):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_json_export_matches_the_listing(client, seed, auth):
+    seed(2, 20, 60)
+    headers = auth(1)
+    body = _export(client, headers, "/export/books")
+    assert json.loads(body) == client.get("/books", headers=headers).get_json()
+
+
+def test_ndjson_export_is_one_compact_object_per_line(client, seed, auth):
+    seed(2, 20, 60)
+    headers = auth(1)
+    lines = _export(client, headers, "/export/reviews?format=ndjson").splitlines()
+    items = [json.loads(line) for line in lines]
+    assert items == client.get("/reviews", headers=headers).get_json()
+    assert all(line == json.dumps(item, separators=(",", ":")) for line, item in zip(lines, items))
+
+
+@pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+def test_export_items_are_encoded_by_orjson(app, client, seed, auth, monkeypatch):
+    seed(2, 5, 10)
+    calls = []
+    real = orjson.dumps
+    monkeypatch.setattr("encoding.orjson.dumps", lambda *a, **k: calls.append(1) or real(*a, **k))
+    _export(client, auth(1), "/export/books?format=ndjson")
+    assert len(calls) == 5
+
+
+def test_unknown_format(client, seed, auth):
+    seed(1)
+    assert client.get("/export/books?format=xml", headers=auth(1)).status_code == 400
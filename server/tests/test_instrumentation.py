@@ -0,0 +1,70 @@
+import re
+
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from helpers import auth_headers, seed_rows
+from instrumentation import RequestMetrics
+from models import db
+
+
+@pytest.fixture
+def instrumented(make_app):
+    app = make_app(INSTRUMENTATION_ENABLED=True, SLOW_REQUEST_MS=10 ** 6)
+    seed_rows(app, 2, 5, 10)
+    return app
+
+
+def test_server_timing_reports_queries_and_phases(instrumented):
+    response = instrumented.test_client().get("/books?_=1", headers=auth_headers(instrumented, 1))
+    timing = response.headers["Server-Timing"]
+    names = [part.split(";")[0] for part in timing.split(", ")]
+    assert names[0] == "db" and names[-1] == "total"
+    assert {"hydrate", "serialize", "json"} <= set(names)
+    queries = int(re.search(r'desc="(\d+) queries"', timing).group(1))
+    assert queries >= 1
+
+
+def test_metrics_histograms_count_requests_per_route(instrumented):
+    client = instrumented.test_client()
+    headers = auth_headers(instrumented, 1)
+    for i in range(3):
+        assert client.get(f"/books?_={i}", headers=headers).status_code == 200
+    assert client.get("/books?sort=nope", headers=headers).status_code == 400
+    body = client.get("/metrics").get_data(as_text=True)
+    labels = 'method="GET",route="/books",status="2xx"'
+    assert f"http_request_duration_seconds_count{{{labels}}} 3" in body
+    assert f'http_request_queries_bucket{{{labels},le="+Inf"}} 3' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/books",status="4xx"} 1' in body
+    assert 'db_pool{stat="checked_out"}' in body
+
+
+def test_slow_requests_are_logged_with_their_statements(make_app, caplog):
+    app = make_app(INSTRUMENTATION_ENABLED=True, SLOW_REQUEST_MS=0)
+    seed_rows(app, 1, 2)
+    # the migrations' fileConfig() replaced the root handlers caplog uses
+    app.logger.addHandler(caplog.handler)
+    try:
+        app.test_client().get("/books", headers=auth_headers(app, 1))
+    finally:
+        app.logger.removeHandler(caplog.handler)
+    messages = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Slow request")]
+    assert len(messages) == 1
+    assert messages[0].startswith("Slow request GET /books:") and "SELECT" in messages[0]
+
+
+def test_failed_statements_leave_no_state_on_the_connection(instrumented):
+    with instrumented.test_request_context():
+        g._metrics = RequestMetrics()
+        with db.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            before = {key: repr(value) for key, value in connection.info.items()}
+            for _ in range(20):
+                with pytest.raises(OperationalError):
+                    connection.execute(text("SELECT * FROM missing_table"))
+                connection.rollback()
+            connection.execute(text("SELECT 1"))
+            assert {key: repr(value) for key, value in connection.info.items()} == before
+        assert g._metrics.queries == 2
@@ -0,0 +1,142 @@
+import base64
+import json
+
+import pytest
+from sqlalchemy import select
+
+from helpers import auth_headers, seed_rows
+from models import db, Book, Review
+
+BOOK_SORTS = {"id": Book.id, "year_published": Book.year_published, "rating": Book.rating_avg,
+              "reviews": Book.review_count}
+
+
+def _walk(client, headers, path, limit=7):
+    """Every item of a cursor-paginated listing, following `next` to the end."""
+    items, cursor = [], None
+    separator = "&" if "?" in path else "?"
+    for _ in range(1000):
+        url = f"{path}{separator}limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page["items"]) <= limit
+        items += page["items"]
+        cursor = page["next"]
+        if cursor is None:
+            return items
+    raise AssertionError("pagination did not end")
+
+
+def _expected(app, model, column, descending, *where):
+    order = [column.desc(), model.id.desc()] if descending else [column, model.id]
+    with app.app_context():
+        return list(db.session.scalars(select(model.id).where(*where).order_by(*order)))
+
+
+@pytest.mark.parametrize("sort", ["id", "-id", "year_published", "-year_published", "rating", "-reviews"])
+def test_book_pages_cover_every_book_once_in_sort_order(app, client, seed, auth, sort):
+    seed(3, 30, 120)
+    items = _walk(client, auth(1), f"/books?sort={sort}")
+    column = BOOK_SORTS[sort.lstrip("-")]
+    assert [item["id"] for item in items] == _expected(app, Book, column, sort.startswith("-"))
+
+
+def test_review_pages_follow_filters_and_sort(app, client, seed, auth):
+    seed(3, 10, 120)
+    items = _walk(client, auth(1), "/reviews?sort=-rating&book_id=2&min_rating=2", limit=3)
+    expected = _expected(app, Review, Review.rating, True, Review.book_id == 2, Review.rating >= 2)
+    assert expected and [item["id"] for item in items] == expected
+
+
+def test_book_filters(app, client, seed, auth):
+    seed(3, 40)
+    headers = auth(1)
+    everything = client.get("/books", headers=headers).get_json()
+    author = everything[0]["author"]
+    cases = {
+        f"author={author}": lambda b: b["author"] == author,
+        "year_from=1900&year_to=2000": lambda b: 1900 <= b["year_published"] <= 2000,
+        "user_id=2": lambda b: b["user_id"] == 2,
+    }
+    for query, keep in cases.items():
+        response = client.get(f"/books?{query}", headers=headers)
+        assert [b["id"] for b in response.get_json()] == [b["id"] for b in everything if keep(b)], query
+
+
+def test_unpaginated_listing_returns_a_plain_list(client, seed, auth):
+    seed(2, 5)
+    body = client.get("/books", headers=auth(1)).get_json()
+    assert isinstance(body, list) and len(body) == 5
+
+
+def test_limit_is_capped(make_app):
+    app = make_app(PAGE_SIZE_MAX=4)
+    seed_rows(app, 1, 10)
+    page = app.test_client().get("/books?limit=100", headers=auth_headers(app, 1)).get_json()
+    assert len(page["items"]) == 4 and page["next"]
+
+
+def test_sparse_fieldsets(client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    books = client.get("/books?fields=id,title", headers=headers).get_json()
+    assert all(set(book) == {"id", "title"} for book in books)
+    books = client.get("/books?fields=id&include=user", headers=headers).get_json()
+    assert all(set(book) == {"id", "user"} and "username" in book["user"] for book in books)
+    reviews = client.get("/reviews?include=book", headers=headers).get_json()
+    assert all("book" in review and "user" not in review for review in reviews)
+
+
+@pytest.mark.parametrize("query, error", [
+    ("limit=0", "limit must be positive"),
+    ("limit=ten", "limit must be an integer"),
+    ("sort=title", "Cannot sort by 'title'"),
+    ("cursor=not-a-cursor", "Invalid cursor"),
+    ("fields=id,password", "Unknown fields: password"),
+    ("include=author", "Unknown relations: author"),
+    ("year_from=soon", "year_from must be an integer"),
+])
+def test_bad_arguments_are_rejected(client, seed, auth, query, error):
+    seed(1, 3)
+    response = client.get(f"/books?{query}", headers=auth(1))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+
+
+def test_cursor_is_bound_to_its_sort(client, seed, auth):
+    seed(1, 5)
+    headers = auth(1)
+    cursor = client.get("/books?limit=2&sort=year_published", headers=headers).get_json()["next"]
+    response = client.get(f"/books?limit=2&sort=-year_published&cursor={cursor}", headers=headers)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Cursor does not match sort order"}
+
+
+def _forge(*parts):
+    raw = json.dumps(list(parts)).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("path, sort, key, last_id", [
+    ("/books", "id", 1, "1"),
+    ("/books", "id", 1, 1.5),
+    ("/books", "id", 1, True),
+    ("/books", "year_published", "1999", 1),
+    ("/books", "year_published", None, 1),
+    ("/books", "rating", "4.5", 1),
+    ("/reviews", "rating", 2.5, 1),
+    ("/reviews", "rating", [3], 1),
+])
+def test_cursor_values_must_match_the_sort_column(client, seed, auth, path, sort, key, last_id):
+    seed(1, 3, 3)
+    response = client.get(f"{path}?limit=2&sort={sort}&cursor={_forge(sort, key, last_id)}", headers=auth(1))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
+
+
+def test_float_sort_keys_accept_whole_numbers(client, seed, auth):
+    seed(1, 3, 3)
+    for key in (4, 4.5):
+        response = client.get(f"/books?limit=2&sort=rating&cursor={_forge('rating', key, 1)}", headers=auth(1))
+        assert response.status_code == 200
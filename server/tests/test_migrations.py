@@ -0,0 +1,79 @@
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+from sqlalchemy import func, select
+
+from helpers import auth_headers
+from models import db, Book, Review, User
+
+INSTANCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance")
+
+
+def _copy(name, tmp_path):
+    target = tmp_path / "old.db"
+    shutil.copyfile(os.path.join(INSTANCE, name), target)
+    with closing(sqlite3.connect(target)) as connection:
+        counts = {t: connection.execute(f'SELECT count(*) FROM "{t}"').fetchone()[0]
+                  for t in ("user", "book", "review")}
+    return target, counts
+
+
+@pytest.mark.parametrize("name, empty_version_table", [
+    ("db.sqlite3", False), ("books.db", False), ("books.db", True),
+])
+def test_pre_migration_databases_upgrade_in_place(make_app, tmp_path, name, empty_version_table):
+    path, counts = _copy(name, tmp_path)
+    if empty_version_table:
+        with closing(sqlite3.connect(path)) as connection:
+            connection.execute("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)")
+            connection.commit()
+    app = make_app(database="old.db")
+    with app.app_context():
+        assert db.session.scalar(select(func.count()).select_from(User)) == counts["user"]
+        assert db.session.scalar(select(func.count()).select_from(Book)) == counts["book"]
+        assert db.session.scalar(select(func.sum(Book.review_count))) == counts["review"]
+        assert db.session.scalar(select(func.count()).select_from(Review)) == counts["review"]
+    books = app.test_client().get("/books/search?q=novel", headers=auth_headers(app, 1)).get_json()
+    assert books["items"]
+
+
+def test_create_all_databases_are_stamped_at_the_plural_names(make_app, tmp_path):
+    path = tmp_path / "old.db"
+    with closing(sqlite3.connect(path)) as connection:
+        connection.executescript(
+            "CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, "
+            "email VARCHAR(120) NOT NULL, password_hash VARCHAR(512) NOT NULL, PRIMARY KEY (id), "
+            "UNIQUE (username), UNIQUE (email));"
+            "CREATE TABLE books (id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, author VARCHAR(100) NOT NULL, "
+            "year_published INTEGER NOT NULL, description TEXT NOT NULL, user_id INTEGER NOT NULL, "
+            "PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES users (id));"
+            "CREATE TABLE reviews (id INTEGER NOT NULL, rating INTEGER NOT NULL, comment TEXT NOT NULL, "
+            "user_id INTEGER NOT NULL, book_id INTEGER NOT NULL, PRIMARY KEY (id), "
+            "FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(book_id) REFERENCES books (id));"
+            "INSERT INTO users VALUES (1, 'a', 'a@example.com', 'x');"
+            "INSERT INTO books VALUES (1, 'Dune', 'Herbert', 1965, 'Desert.', 1);"
+            "INSERT INTO reviews VALUES (1, 4, 'Good.', 1, 1);"
+        )
+    app = make_app(database="old.db")
+    with app.app_context():
+        assert db.session.get(Book, 1).review_count == 1
+
+
+def test_backfilled_timestamps_page_through_sync(make_app, tmp_path):
+    # every migrated row shares one updated_at, so pages rely on the tie-break
+    _, counts = _copy("books.db", tmp_path)
+    app = make_app(database="old.db")
+    client = app.test_client()
+    headers = auth_headers(app, 1)
+    books, cursor = [], None
+    while True:
+        query = {"limit": 2, "cursor": cursor} if cursor else {"limit": 2}
+        page = client.get("/sync", query_string=query, headers=headers).get_json()
+        books += [book["id"] for book in page["books"]]
+        cursor = page["cursor"]
+        if cursor is None:
+            break
+    assert len(books) == len(set(books)) == counts["book"]
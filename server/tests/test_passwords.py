@@ -0,0 +1,104 @@
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from config import Config
+from models import db, User
+from passwords import HashPoolFull, parse_method, password_hasher
+
+SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("short, full", [
+    ("scrypt", "scrypt:32768:8:1"),
+    ("pbkdf2", "pbkdf2:sha256:600000"),
+    ("pbkdf2:sha512", "pbkdf2:sha512:600000"),
+])
+def test_shorthand_methods_match_their_expansion(short, full):
+    assert parse_method(short) == parse_method(full)
+
+
+def test_parameters_that_differ_do_not_match():
+    assert parse_method("scrypt:16384:8:1") != parse_method("scrypt")
+    assert parse_method("pbkdf2:sha256:1000") != parse_method("pbkdf2")
+    assert parse_method("md5") is None
+
+
+def _signup(client):
+    response = client.post("/signup", json={"username": "reader", "email": "r@example.com", "password": "pw"})
+    assert response.status_code == 201
+    return response.get_json()["user"]["id"]
+
+
+def _stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+
+def test_shorthand_method_does_not_rehash_every_login(make_app):
+    app = make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256")
+    client = app.test_client()
+    user_id = _signup(client)
+    stored = _stored_hash(app, user_id)
+    assert client.post("/login", json={"username": "reader", "password": "pw"}).status_code == 200
+    assert _stored_hash(app, user_id) == stored
+
+
+def test_outdated_hash_is_upgraded_on_login(make_app):
+    app = make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000")
+    client = app.test_client()
+    user_id = _signup(client)
+    password_hasher.method = "pbkdf2:sha256:2000"
+    password_hasher.parameters = parse_method(password_hasher.method)
+    assert client.post("/login", json={"username": "reader", "password": "pw"}).status_code == 200
+    assert _stored_hash(app, user_id).startswith("pbkdf2:sha256:2000$")
+
+
+def test_login_succeeds_when_the_rehash_is_skipped(make_app, monkeypatch):
+    app = make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000")
+    client = app.test_client()
+    user_id = _signup(client)
+    stored = _stored_hash(app, user_id)
+    password_hasher.parameters = parse_method("pbkdf2:sha256:2000")
+
+    def full(password):
+        raise HashPoolFull()
+    monkeypatch.setattr(password_hasher, "hash", full)
+    response = client.post("/login", json={"username": "reader", "password": "pw"})
+    assert response.status_code == 200
+    assert "access_token" in response.get_json()
+    assert _stored_hash(app, user_id) == stored
+
+
+def test_saturated_pool_rejects_logins_right_away(make_app):
+    app = make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000", PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    client = app.test_client()
+    _signup(client)
+    taken, release = threading.Event(), threading.Event()
+
+    def hold():
+        taken.set()
+        release.wait(5)
+    holder = threading.Thread(target=password_hasher._run, args=(hold,))
+    holder.start()
+    try:
+        assert taken.wait(5)
+        started = time.perf_counter()
+        response = client.post("/login", json={"username": "reader", "password": "pw"})
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        holder.join()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert password_hasher.rejected == 1
+    assert client.post("/login", json={"username": "reader", "password": "pw"}).status_code == 200
+
+
+def test_default_pool_leaves_request_threads_free():
+    with open(os.path.join(SERVER, "Procfile")) as procfile:
+        threads = int(re.search(r"--threads (\d+)", procfile.read()).group(1))
+    assert Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_QUEUE < threads
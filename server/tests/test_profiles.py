@@ -0,0 +1,49 @@
+import time
+
+from models import db, User
+
+BOOK = {"title": "Mine", "author": "Me", "year_published": 2001, "description": "d"}
+
+
+def _stats(client, headers, user_id):
+    return client.get(f"/users/{user_id}", headers=headers).get_json()["stats"]
+
+
+def test_stats(client, seed, auth):
+    seed(2)
+    owner, reader = auth(1), auth(2)
+    book = client.post("/books", json=BOOK, headers=owner).get_json()
+    for rating in (4, 5):
+        client.post("/reviews", json={"book_id": book["id"], "rating": rating, "comment": "c"}, headers=owner)
+
+    stats = _stats(client, reader, 1)
+    assert stats["books"] == 1
+    assert stats["reviews"] == 2
+    assert stats["average_rating_given"] == 4.5
+    assert isinstance(stats["average_rating_given"], float)
+    assert stats["rating_histogram"] == [0, 0, 0, 1, 1]
+
+
+def test_others_reviews_do_not_move_last_active(client, seed, auth):
+    seed(2)
+    owner, reader = auth(1), auth(2)
+    book = client.post("/books", json=BOOK, headers=owner).get_json()
+    last_active = _stats(client, reader, 1)["last_active"]
+    assert last_active is not None
+
+    time.sleep(0.01)
+    client.post("/reviews", json={"book_id": book["id"], "rating": 3, "comment": "c"}, headers=reader)
+    assert _stats(client, reader, 1)["last_active"] == last_active
+    assert _stats(client, reader, 2)["last_active"] > last_active
+
+
+def test_unknown_user(client, seed, auth):
+    seed(1)
+    assert client.get("/users/99", headers=auth(1)).status_code == 404
+
+
+def test_me_is_the_caller(app, client, seed, auth):
+    seed(3)
+    with app.app_context():
+        username = db.session.get(User, 3).username
+    assert client.get("/me", headers=auth(3)).get_json()["user"]["username"] == username
@@ -0,0 +1,53 @@
+"""Serialized endpoints load their relationship graphs up front, so the
+number of statements they run does not grow with the rows returned."""
+import pytest
+
+from models import db, Book, Review
+from helpers import auth_headers, count_statements, seed_rows
+
+# users, books, reviews
+SMALL = (3, 10, 40)
+LARGE = (30, 100, 400)
+
+
+def _owner(app, model, row_id):
+    with app.app_context():
+        return db.session.get(model, row_id).user_id
+
+
+REQUESTS = {
+    "GET /books": ("get", "/books", None, None),
+    "GET /books page": ("get", "/books?limit=20", None, None),
+    "GET /reviews": ("get", "/reviews", None, None),
+    "GET /reviews page": ("get", "/reviews?limit=20", None, None),
+    "PATCH /books/<id>": ("patch", "/books/1", Book, {"title": "Renamed"}),
+    "PATCH /reviews/<id>": ("patch", "/reviews/1", Review, {"comment": "Edited"}),
+}
+
+
+def _statements(make_app, sizes, name):
+    method, path, model, body = REQUESTS[name]
+    app = make_app(database=f"{sizes[1]}.db")
+    seed_rows(app, *sizes)
+    headers = auth_headers(app, _owner(app, model, 1) if model else 1)
+    client = app.test_client()
+    response, count = count_statements(app, lambda: client.open(path, method=method, json=body, headers=headers))
+    assert response.status_code == 200
+    return count
+
+
+@pytest.mark.parametrize("name", list(REQUESTS))
+def test_statement_count_is_independent_of_row_count(make_app, name):
+    assert _statements(make_app, SMALL, name) == _statements(make_app, LARGE, name)
+
+
+def test_book_update_returns_the_full_graph(app, seed, auth):
+    seed(*SMALL)
+    owner = _owner(app, Book, 1)
+    response = app.test_client().patch("/books/1", json={"title": "Renamed"}, headers=auth(owner))
+    body = response.get_json()
+    assert body["title"] == "Renamed"
+    assert body["user"]["id"] == owner
+    with app.app_context():
+        assert len(body["reviews"]) == Review.query.filter_by(book_id=1).count()
+    assert all("user" in review for review in body["reviews"])
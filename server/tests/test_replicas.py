@@ -0,0 +1,85 @@
+import sqlite3
+
+from flask import g
+from sqlalchemy import event, func, select, update
+
+from models import db, Book
+from replicas import replicas
+from helpers import auth_headers, seed_rows
+
+NEW_BOOK = {"title": "New", "author": "Someone", "year_published": 2000, "description": "d"}
+
+
+def _with_replica(make_app, tmp_path, url=None):
+    """An app whose replica is a copy of the seeded primary with book 1
+    retitled, so each response shows which database served it."""
+    seed_rows(make_app(), 2, 5, 10)
+    if url is None:
+        primary = sqlite3.connect(str(tmp_path / "test.db"))
+        replica = sqlite3.connect(str(tmp_path / "replica.db"))
+        primary.backup(replica)
+        replica.execute("UPDATE books SET title = 'Replica copy' WHERE id = 1")
+        replica.commit()
+        primary.close()
+        replica.close()
+        url = "sqlite:///" + str(tmp_path / "replica.db")
+    return make_app(DATABASE_REPLICA_URLS=url)
+
+
+def _titles(client, headers, query):
+    return {item["id"]: item["title"] for item in client.get("/books" + query, headers=headers).get_json()["items"]}
+
+
+def test_reads_go_to_the_replica(make_app, tmp_path):
+    app = _with_replica(make_app, tmp_path)
+    client = app.test_client()
+    assert _titles(client, auth_headers(app, 1), "?limit=10")[1] == "Replica copy"
+    assert [r["selected"] for r in replicas.stats()["replicas"]] == [1]
+
+
+def test_writes_and_the_writers_reads_go_to_the_primary(make_app, tmp_path):
+    app = _with_replica(make_app, tmp_path)
+    client = app.test_client()
+    writer, other = auth_headers(app, 1), auth_headers(app, 2)
+    assert client.post("/books", json=NEW_BOOK, headers=writer).status_code == 201
+
+    replica = sqlite3.connect(str(tmp_path / "replica.db"))
+    assert replica.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 5
+    replica.close()
+    # the writer reads their own write from the primary; other users keep
+    # reading the replica (distinct queries, so neither is a cache hit)
+    titles = _titles(client, writer, "?limit=10")
+    assert len(titles) == 6 and titles[1] != "Replica copy"
+    titles = _titles(client, other, "?limit=11")
+    assert len(titles) == 5 and titles[1] == "Replica copy"
+
+
+def test_a_write_pins_the_rest_of_the_request_to_the_primary(make_app, tmp_path):
+    app = _with_replica(make_app, tmp_path)
+    statements = []
+    event.listen(replicas.engines[0], "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    with app.test_request_context():
+        g._replica_reads = True
+        book = db.session.get(Book, 1)
+        assert book.title == "Replica copy"
+        served = len(statements)
+
+        book.title = "Edited"  # autoflushed by the next query
+        assert db.session.scalar(select(func.count()).select_from(Book)) == 5
+        db.session.execute(update(Book).where(Book.id == 2).values(title="Edited too"))
+        assert db.session.scalar(select(Book.title).where(Book.id == 2)) == "Edited too"
+        assert len(statements) == served
+        db.session.rollback()
+
+
+def test_reads_fall_back_to_the_primary(make_app, tmp_path):
+    app = _with_replica(make_app, tmp_path, url="sqlite:///" + str(tmp_path / "missing" / "replica.db"))
+    assert len(_titles(app.test_client(), auth_headers(app, 1), "?limit=10")) == 5
+    stats = replicas.stats()
+    assert stats["primary_reads"] == 1
+    assert stats["replicas"][0]["failures"] >= 1 and not stats["replicas"][0]["healthy"]
+
+    app = make_app(DATABASE_REPLICA_URLS="")
+    assert replicas.engines == []
+    assert len(_titles(app.test_client(), auth_headers(app, 1), "?limit=11")) == 5
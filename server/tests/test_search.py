@@ -0,0 +1,65 @@
+from models import db, Book
+
+BOOKS = [
+    ("Dragon Harbor", "Ann Lee", 1990, 1),
+    ("Dragon Winter", "Ann Lee", 2005, 2),
+    ("Dragon Glass", "Bo Chen", 2010, 1),
+    ("Silver Orchard", "Ann Lee", 2000, 1),
+]
+
+
+def _search(client, headers, query):
+    response = client.get("/books/search?" + query, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _titles(body):
+    return [item["title"] for item in body["items"]]
+
+
+def _add_books(app):
+    with app.app_context():
+        db.session.add_all([
+            Book(title=title, author=author, year_published=year, description="A tale.", user_id=owner)
+            for title, author, year, owner in BOOKS
+        ])
+        db.session.commit()
+
+
+def test_filters_narrow_the_matches(app, client, seed, auth):
+    seed(2)
+    _add_books(app)
+    headers = auth(1)
+    assert sorted(_titles(_search(client, headers, "q=dragon"))) == ["Dragon Glass", "Dragon Harbor", "Dragon Winter"]
+    assert sorted(_titles(_search(client, headers, "q=dragon&author=Ann+Lee"))) == ["Dragon Harbor", "Dragon Winter"]
+    assert _titles(_search(client, headers, "q=dragon&year_from=2000&year_to=2006")) == ["Dragon Winter"]
+    assert sorted(_titles(_search(client, headers, "q=dragon&user_id=1"))) == ["Dragon Glass", "Dragon Harbor"]
+
+
+def test_sort_replaces_relevance(app, client, seed, auth):
+    seed(2)
+    _add_books(app)
+    headers = auth(1)
+    assert _titles(_search(client, headers, "q=dragon&sort=-year_published")) == [
+        "Dragon Glass", "Dragon Winter", "Dragon Harbor",
+    ]
+
+
+def test_pages_follow_the_cursor(app, client, seed, auth):
+    seed(2)
+    _add_books(app)
+    headers = auth(1)
+    first = _search(client, headers, "q=dragon&sort=year_published&limit=2")
+    assert _titles(first) == ["Dragon Harbor", "Dragon Winter"]
+    second = _search(client, headers, f"q=dragon&sort=year_published&limit=2&cursor={first['next']}")
+    assert _titles(second) == ["Dragon Glass"]
+    assert second["next"] is None
+
+    mismatched = client.get(f"/books/search?q=dragon&limit=2&cursor={first['next']}", headers=headers)
+    assert mismatched.status_code == 400
+
+
+def test_query_is_required(client, seed, auth):
+    seed(1)
+    assert client.get("/books/search", headers=auth(1)).status_code == 400
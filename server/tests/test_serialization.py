@@ -0,0 +1,57 @@
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import insert
+
+from aggregates import refresh_book_aggregates
+from helpers import auth_headers
+from models import db, Book, Review, User
+
+
+def _rows(app):
+    """Users, books and reviews with text the encoders must agree on,
+    plus a review whose author row is gone."""
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"id": 1, "username": "zoë", "email": "z@example.com", "password_hash": "x"},
+            {"id": 2, "username": "plain", "email": "p@example.com", "password_hash": "x"},
+        ])
+        db.session.execute(insert(Book), [
+            {"id": 1, "title": "Cien años de soledad", "author": "García Márquez", "year_published": 1967,
+             "description": 'Quotes " and \\ backslashes\nand\ttabs   line separator', "user_id": 1},
+            {"id": 2, "title": "三体", "author": "刘慈欣 🚀", "year_published": 2008, "description": "", "user_id": 2},
+            {"id": 3, "title": "No reviews", "author": "Nobody", "year_published": 2000, "description": "d",
+             "user_id": 2},
+        ])
+        db.session.execute(insert(Review), [
+            {"id": 1, "rating": 5, "comment": "¡Magnífico!", "user_id": 2, "book_id": 1},
+            {"id": 2, "rating": 3, "comment": "😐", "user_id": 1, "book_id": 2},
+        ])
+        db.session.commit()
+        with db.engine.connect() as connection:
+            # the author of this review has since been removed
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.exec_driver_sql(
+                "INSERT INTO reviews (id, rating, comment, user_id, book_id, updated_at) "
+                "VALUES (3, 4, 'orphan', 99, 1, '2024-01-01 00:00:00')"
+            )
+            connection.commit()
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+        refresh_book_aggregates(db.session)
+        db.session.commit()
+
+
+def _reference(app, model):
+    # what the endpoints returned before the Core read path:
+    # jsonify([item.to_dict(include_relationships=True) ...]) with Flask's provider
+    with app.app_context():
+        items = [item.to_dict(include_relationships=True) for item in model.query.order_by(model.id)]
+        return DefaultJSONProvider(app).response(items).get_data()
+
+
+def test_listings_match_the_to_dict_output_byte_for_byte(app):
+    _rows(app)
+    client = app.test_client()
+    headers = auth_headers(app, 1)
+    for path, model in (("/books", Book), ("/reviews", Review)):
+        body = client.get(path, headers=headers).get_data()
+        assert body == _reference(app, model), path
+        assert body.isascii()
@@ -0,0 +1,41 @@
+from models import db, BookSimilarity
+from similarity import rebuild_similarities, update_similarities
+
+
+def _neighbour(app):
+    with app.app_context():
+        rebuild_similarities(db.session)
+        row = db.session.execute(db.select(BookSimilarity).order_by(BookSimilarity.book_id)).scalars().first()
+        return row.book_id, row.similar_book_id
+
+
+def _similar(client, headers, book_id):
+    return {item["book"]["id"]: item["book"] for item in client.get(f"/books/{book_id}/similar", headers=headers).get_json()}
+
+
+def test_cached_neighbours_show_new_review_counts(app, client, seed, auth):
+    seed(40, 20, 600)
+    book_id, neighbour_id = _neighbour(app)
+    headers = auth(1)
+    before = _similar(client, headers, book_id)[neighbour_id]["review_count"]
+
+    response = client.post("/reviews", json={"book_id": neighbour_id, "rating": 5, "comment": "c"}, headers=headers)
+    assert response.status_code == 201
+    assert _similar(client, headers, book_id)[neighbour_id]["review_count"] == before + 1
+
+
+def test_update_matches_rebuild_membership(app, client, seed, auth):
+    seed(40, 20, 600)
+    book_id, _ = _neighbour(app)
+    for rating in (1, 5, 1):
+        client.post("/reviews", json={"book_id": book_id, "rating": rating, "comment": "c"}, headers=auth(rating))
+
+    def neighbours():
+        rows = db.session.execute(db.select(BookSimilarity.book_id, BookSimilarity.similar_book_id))
+        return {(row.book_id, row.similar_book_id) for row in rows if row.book_id == book_id}
+
+    with app.app_context():
+        assert update_similarities(db.session) == 1
+        updated = neighbours()
+        rebuild_similarities(db.session)
+        assert neighbours() == updated
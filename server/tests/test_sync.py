@@ -0,0 +1,131 @@
+import time
+
+from models import db, Review
+
+BOOK = {"title": "Synced", "author": "A", "year_published": 2000, "description": "d"}
+
+
+def _sync(client, headers, token=None, limit=None, cursor=None):
+    args = {"since": token, "limit": limit, "cursor": cursor}
+    response = client.get("/sync", query_string={k: v for k, v in args.items() if v is not None}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _since_now(app, client, headers):
+    # a token from before the safety window would resend everything
+    with app.app_context():
+        app.config["SYNC_SAFETY_WINDOW_SECONDS"] = 0
+    token = _sync(client, headers)["next"]
+    time.sleep(0.01)
+    return token
+
+
+def test_first_sync_is_a_full_snapshot(client, seed, auth):
+    seed(2, 5, 10)
+    body = _sync(client, auth(1))
+    assert body["full"] is True
+    assert len(body["books"]) == 5
+    assert len(body["reviews"]) == 10
+
+
+def test_delta_has_changes_and_deletions(app, client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    token = _since_now(app, client, headers)
+    book = client.post("/books", json=BOOK, headers=headers).get_json()
+    client.post("/reviews", json={"book_id": book["id"], "rating": 4, "comment": "c"}, headers=headers)
+    with app.app_context():
+        mine = Review.query.filter_by(user_id=1).first()
+    client.delete(f"/reviews/{mine.id}", headers=headers)
+
+    body = _sync(client, headers, token)
+    assert body["full"] is False
+    # the deleted review's book is resent with its new aggregates
+    books = {b["id"]: b for b in body["books"]}
+    assert set(books) == {book["id"], mine.book_id}
+    assert books[book["id"]]["review_count"] == 1
+    assert len(body["reviews"]) == 1
+    assert body["deleted"] == {"books": [], "reviews": [mine.id]}
+
+
+def test_deleted_ids_are_not_reused(app, client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    token = _since_now(app, client, headers)
+    created = client.post("/reviews", json={"book_id": 1, "rating": 4, "comment": "c"}, headers=headers).get_json()
+    client.delete(f"/reviews/{created['id']}", headers=headers)
+    again = client.post("/reviews", json={"book_id": 1, "rating": 5, "comment": "c"}, headers=headers).get_json()
+    assert again["id"] != created["id"]
+
+    body = _sync(client, headers, token)
+    assert body["deleted"]["reviews"] == [created["id"]]
+    assert [r["id"] for r in body["reviews"]] == [again["id"]]
+
+
+def test_tombstones_of_recreated_rows_are_not_sent(app, client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    token = _since_now(app, client, headers)
+    with app.app_context():
+        review = db.session.get(Review, 10)
+        values = {c.key: getattr(review, c.key) for c in Review.__table__.columns}
+        db.session.delete(review)
+        db.session.commit()
+        # as an id reused before ids were kept unique
+        db.session.add(Review(**dict(values, comment="recreated", updated_at=None)))
+        db.session.commit()
+
+    body = _sync(client, headers, token)
+    assert body["deleted"]["reviews"] == []
+    assert [(r["id"], r["comment"]) for r in body["reviews"]] == [(10, "recreated")]
+
+
+def test_invalid_token(client, seed, auth):
+    seed(1)
+    assert client.get("/sync?since=nonsense", headers=auth(1)).status_code == 400
+
+
+def _pages(client, headers, limit, token=None):
+    """Every page of one sync, following `cursor` to the end."""
+    pages = [_sync(client, headers, token, limit)]
+    while pages[-1]["cursor"] is not None:
+        assert pages[-1]["next"] is None
+        pages.append(_sync(client, headers, limit=limit, cursor=pages[-1]["cursor"]))
+    return pages
+
+
+def test_snapshot_is_paged(client, seed, auth):
+    seed(3, 7, 15)
+    pages = _pages(client, auth(1), 2)
+    assert len(pages) == 8 and all(page["full"] for page in pages)
+    assert all(len(page["books"]) <= 2 and len(page["reviews"]) <= 2 for page in pages)
+    assert sorted(b["id"] for page in pages for b in page["books"]) == list(range(1, 8))
+    assert sorted(r["id"] for page in pages for r in page["reviews"]) == list(range(1, 16))
+    assert pages[-1]["next"] is not None
+
+
+def test_delta_is_paged(app, client, seed, auth):
+    seed(2, 5, 10)
+    headers = auth(1)
+    token = _since_now(app, client, headers)
+    created = [client.post("/books", json=BOOK, headers=headers).get_json()["id"] for _ in range(3)]
+    with app.app_context():
+        mine = [r.id for r in Review.query.filter_by(user_id=1)]
+    for review_id in mine:
+        client.delete(f"/reviews/{review_id}", headers=headers)
+
+    pages = _pages(client, headers, 1, token)
+    assert not any(page["full"] for page in pages)
+    books = {b["id"] for page in pages for b in page["books"]}
+    assert set(created) <= books
+    assert sorted(r for page in pages for r in page["deleted"]["reviews"]) == sorted(mine)
+    assert len(pages) == max(len(books), len(mine))
+
+
+def test_invalid_cursor(client, seed, auth):
+    seed(1)
+    for cursor in ("nonsense", "WzEsMiwzXQ"):  # the second is [1,2,3]
+        response = client.get(f"/sync?cursor={cursor}", headers=auth(1))
+        assert response.status_code == 400
+        assert response.get_json() == {"error": "Invalid sync cursor"}